@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+bench.py
+
+Benchmarks sideways against synthetic fixtures
+and writes the results as JSON.
+
+    python3 benchmarks/bench.py --out bench.json
+    python3 benchmarks/bench.py --out new.json --compare old.json
+
+The sideways package in this checkout is benchmarked,
+not an installed one.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from iframes import IFramer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import fixtures  # noqa: E402
+from sideways import (
+    SplitStream,
+    Segment,
+    Sideways,
+    argue,
+    do_aio,
+    version,
+)  # noqa: E402
+from sideways.npscan import scan  # noqa: E402
+from sideways.rapindex import PKT_SIZE, RapIndex  # noqa: E402
+from sideways.aes import Cipher  # noqa: E402
+from sideways.probe import PtsProbe  # noqa: E402
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        """
+        handle_error ignores clients dropping
+        pooled connections on exit.
+        """
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class LocalOrigin:
+    """
+    LocalOrigin serves a fixture directory over
+    keep-alive http, a stand-in for a CDN origin.
+    """
+
+    def __init__(self, root):
+        handler = partial(_Handler, directory=root)
+        self.server = _Server(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    quiet drops what sideways prints.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def sideways_args(**kwargs):
+    """
+    sideways_args returns the default sideways
+    command line args, with kwargs set.
+    """
+    argv = sys.argv
+    sys.argv = ["sideways"]
+    try:
+        args = argue()
+    finally:
+        sys.argv = argv
+    for key, val in kwargs.items():
+        setattr(args, key, val)
+    return args
+
+
+def mk_sideways(m3u8, output_dir, **kwargs):
+    """
+    mk_sideways returns a Sideways set up
+    to read m3u8 and write to output_dir.
+    """
+    args = sideways_args(input=m3u8, output_dir=output_dir, **kwargs)
+    sway = Sideways(args)
+    sway.args.sidecar = args.sidecar_file
+    sway.setup()
+    return sway
+
+
+def timed(func, repeat, setup=None):
+    """
+    timed returns the seconds each of repeat calls
+    of func takes, calling setup untimed before each.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with quiet():
+            started = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - started)
+    return times
+
+
+def summary(times, **extra):
+    """
+    summary returns the stats for times,
+    in seconds, with extra fields.
+    """
+    result = {
+        "runs": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "max": max(times),
+        "unit": "s",
+    }
+    result.update(extra)
+    return result
+
+
+class Bench:
+    """
+    Bench runs each benchmark against fixtures
+    written to a temporary directory.
+    """
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.tmp = tempfile.mkdtemp(prefix="sideways-bench-")
+        self.fx = os.path.join(self.tmp, "fx")
+        self.out = os.path.join(self.tmp, "out")
+        os.makedirs(self.out)
+        os.makedirs(self.fx)
+        self.origin = LocalOrigin(self.fx)
+        self.results = {}
+
+    def close(self):
+        self.origin.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def run(self, names=None):
+        """
+        run runs the benchmarks named in names, or all of them.
+        """
+        for name in BENCHMARKS:
+            if names and name not in names:
+                continue
+            print(f"{name} ...", file=sys.stderr, flush=True)
+            result = getattr(self, f"bench_{name}")()
+            if result is None:
+                print(f"{name} skipped", file=sys.stderr, flush=True)
+                continue
+            self.results[name] = result
+        return self.results
+
+    def _segment(self):
+        path = os.path.join(self.fx, "split", "seg.ts")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data, idrs = fixtures.ts_segment(10.0, self.opts.duration)
+            with open(path, "wb") as seg:
+                seg.write(data)
+            self._idrs = idrs
+        return path, self._idrs
+
+    def _split(self, uri):
+        path, idrs = self._segment()
+        splice_pts, offset = idrs[len(idrs) // 2]
+        stream = SplitStream()
+        out = os.path.join(self.out, "split")
+        os.makedirs(out, exist_ok=True)
+        found = []
+        times = timed(
+            lambda: found.append(stream.split_at(uri, splice_pts - 0.01, out)[0]),
+            self.opts.repeat,
+        )
+        assert found[-1] == splice_pts, (found[-1], splice_pts)
+        return summary(
+            times, bytes=os.path.getsize(path), splice_pts=splice_pts, offset=offset
+        )
+
+    def bench_split_at_local(self):
+        path, _ = self._segment()
+        return self._split(path)
+
+    def bench_split_at_http(self):
+        self._segment()
+        return self._split(self.origin.url + "split/seg.ts")
+
+    def _hd_segment(self):
+        if not hasattr(self, "_hd"):
+            self._hd = fixtures.ts_segment_1080p(10.0, self.opts.duration)
+        return self._hd
+
+    def _rapindex(self, engine):
+        data, idrs = self._hd_segment()
+        found = []
+        times = timed(
+            lambda: found.append(RapIndex(data, engine=engine)), self.opts.repeat
+        )
+        assert list(zip(found[-1].pts, found[-1].offsets)) == idrs
+        return summary(times, bytes=len(data), raps=len(idrs))
+
+    def bench_rapindex_numpy(self):
+        if scan is None:
+            return None
+        return self._rapindex("numpy")
+
+    def bench_rapindex_python(self):
+        return self._rapindex("python")
+
+    def bench_rapindex_iframer(self):
+        data, idrs = self._hd_segment()
+        found = []
+
+        def parse():
+            framer = IFramer(shush=True)
+            found.append(
+                [
+                    framer.parse(data[idx : idx + PKT_SIZE])
+                    for idx in range(0, len(data), PKT_SIZE)
+                ]
+            )
+
+        times = timed(parse, self.opts.repeat)
+        assert [pts for pts in found[-1] if pts] == [pts for pts, _ in idrs]
+        return summary(times, bytes=len(data), raps=len(idrs))
+
+    def _decode(self, kind):
+        folder = os.path.join(self.fx, f"decode_{kind}")
+        fixtures.write_rendition(folder, window=1, kind=kind)
+        base = folder + "/"
+        media = base + f"seg0.{kind}"
+        prober = PtsProbe()
+        starts = []
+
+        def decode():
+            seg = Segment(
+                ["#EXTINF:6.000000,", f"seg0.{kind}"],
+                media,
+                None,
+                base,
+                True,
+                prober=prober,
+            )
+            starts.append(seg.decode())
+
+        times = timed(decode, self.opts.repeat)
+        assert starts[-1] == 10.0, starts[-1]
+        return summary(times)
+
+    def bench_segment_decode_ts(self):
+        return self._decode("ts")
+
+    def bench_segment_decode_aac(self):
+        return self._decode("aac")
+
+    def _live(self, name):
+        folder = os.path.join(self.fx, name)
+        out = os.path.join(self.out, name)
+        os.makedirs(out, exist_ok=True)
+        index = fixtures.write_rendition(
+            folder, window=self.opts.window, endlist=False, duration=self.opts.duration
+        )
+        return folder, out, index
+
+    def bench_read_m3u8_full(self):
+        folder, out, index = self._live("full")
+        sways = []
+        times = timed(
+            lambda: sways[-1].read_m3u8(),
+            self.opts.repeat,
+            setup=lambda: sways.append(mk_sideways(index, out)),
+        )
+        assert len(sways[-1].segments) == self.opts.window - 1
+        return summary(times, segments=self.opts.window)
+
+    def bench_read_m3u8_reload(self):
+        folder, out, index = self._live("reload")
+        with quiet():
+            sway = mk_sideways(index, out)
+            sway.read_m3u8()
+        msn = [0]
+
+        def advance():
+            msn[0] += 1
+            fixtures.write_rendition(
+                folder,
+                window=self.opts.window,
+                msn=msn[0],
+                endlist=False,
+                duration=self.opts.duration,
+            )
+
+        times = timed(sway.read_m3u8, self.opts.repeat, setup=advance)
+        return summary(times, window=self.opts.window, new_segments=1)
+
+    def bench_write_m3u8(self):
+        folder, out, index = self._live("write")
+        with quiet():
+            sway = mk_sideways(index, out)
+            sway.read_m3u8()
+        times = timed(sway.write_m3u8, self.opts.repeat)
+        return summary(times, bytes=len(sway.rendered))
+
+    def bench_load_sidecar(self):
+        folder, out, index = self._live("sidecar")
+        sidecar = os.path.join(self.tmp, "sidecar.txt")
+        fixtures.write_sidecar(sidecar, self.opts.cues, start=1.0e6, step=0.01)
+        sways = []
+
+        def setup():
+            with quiet():
+                sway = mk_sideways(index, out, sidecar_file=sidecar)
+                sway.start = 10.0
+            sways.append(sway)
+
+        times = timed(lambda: sways[-1].load_sidecar(), self.opts.repeat, setup=setup)
+        assert len(sways[-1].sidecar) == self.opts.cues, len(sways[-1].sidecar)
+        return summary(times, cues=self.opts.cues)
+
+    def _master(self):
+        folder = os.path.join(self.fx, "master")
+        if not os.path.isdir(folder):
+            fixtures.write_master(
+                folder,
+                renditions=self.opts.renditions,
+                window=self.opts.window,
+                duration=self.opts.duration,
+            )
+        sidecar = os.path.join(self.tmp, "run_sidecar.txt")
+        with open(sidecar, "w", encoding="utf-8") as side:
+            side.write(f"22.0,{fixtures.CUE_OUT}\n36.0,{fixtures.CUE_IN}\n")
+        return self.origin.url + "master/master.m3u8", sidecar
+
+    @staticmethod
+    def _splits(out):
+        return sum(
+            name.startswith("a-") for _, _, names in os.walk(out) for name in names
+        )
+
+    def bench_full_run_aio(self):
+        master, sidecar = self._master()
+        out = os.path.join(self.out, "aio")
+
+        def run():
+            shutil.rmtree(out, ignore_errors=True)
+            os.makedirs(out)
+            args = sideways_args(
+                input=master, output_dir=out, sidecar_file=sidecar, engine="aio"
+            )
+            do_aio([args], workers=args.workers)
+
+        times = timed(run, self.opts.repeat)
+        return summary(
+            times,
+            renditions=self.opts.renditions,
+            segments=self.opts.window,
+            splits=self._splits(out),
+        )
+
+    def bench_full_run_mp(self):
+        master, sidecar = self._master()
+        out = os.path.join(self.out, "mp")
+        cmd = [sys.executable, os.path.join(ROOT, "bin", "sideways")]
+        cmd += ["-i", master, "-s", sidecar, "-o", out, "-e", "mp"]
+        env = dict(os.environ, PYTHONPATH=ROOT)
+
+        def run():
+            shutil.rmtree(out, ignore_errors=True)
+            os.makedirs(out)
+            subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        times = timed(run, self.opts.repeat)
+        return summary(
+            times,
+            renditions=self.opts.renditions,
+            segments=self.opts.window,
+            splits=self._splits(out),
+            note="includes interpreter start up",
+        )
+
+
+BENCHMARKS = [
+    name[len("bench_") :] for name in Bench.__dict__ if name.startswith("bench_")
+]
+
+
+def environment():
+    """
+    environment describes what was benchmarked.
+    """
+    return {
+        "sideways": version(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": scan is not None,
+        "cryptography": Cipher is not None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def compare(old, new, threshold):
+    """
+    compare prints the median of each benchmark
+    in old and new, and returns the names of
+    those that are more than threshold slower.
+    """
+    slower = []
+    print(f"{'benchmark':<24}{'old':>12}{'new':>12}{'ratio':>9}")
+    for name, result in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if not before:
+            print(f"{name:<24}{'-':>12}{result['median']:>12.6f}")
+            continue
+        ratio = result["median"] / before["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = " slower"
+            slower.append(name)
+        print(
+            f"{name:<24}{before['median']:>12.6f}{result['median']:>12.6f}{ratio:>9.2f}{flag}"
+        )
+    return slower
+
+
+def cli():
+    """
+    cli parses args, runs the benchmarks and writes JSON.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "-o", "--out", default=None, help="JSON output file, default stdout"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5, help="runs of each benchmark"
+    )
+    parser.add_argument(
+        "-w", "--window", type=int, default=10, help="segments per playlist"
+    )
+    parser.add_argument(
+        "-n", "--renditions", type=int, default=3, help="renditions in the full runs"
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=6.0, help="segment duration"
+    )
+    parser.add_argument(
+        "-c", "--cues", type=int, default=10000, help="cues in the load_sidecar file"
+    )
+    parser.add_argument(
+        "-b",
+        "--bench",
+        action="append",
+        choices=BENCHMARKS,
+        help="run only these, repeatable",
+    )
+    parser.add_argument(
+        "--compare", default=None, help="JSON results to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="with --compare, slower than this ratio fails",
+    )
+    opts = parser.parse_args()
+    bench = Bench(opts)
+    try:
+        results = bench.run(opts.bench)
+    finally:
+        bench.close()
+    report = {
+        "environment": environment(),
+        "params": {
+            key: getattr(opts, key)
+            for key in ("repeat", "window", "renditions", "duration", "cues")
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if opts.out:
+        with open(opts.out, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+    if opts.compare:
+        with open(opts.compare, encoding="utf-8") as old:
+            slower = compare(json.load(old), report, opts.threshold)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
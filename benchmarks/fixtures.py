@@ -0,0 +1,184 @@
+"""
+fixtures.py
+
+Synthetic MPEG-TS and AAC segments, HLS playlists
+and sidecar files for the benchmarks.
+Every IDR frame position and PTS is known.
+"""
+
+import os
+
+PKT_SIZE = 188
+VIDEO_PID = 0x100
+CUE_OUT = "/DAlAAAAAAAAAP/wFAUAAAABf+/+ACJVEP4AF1iQAAEAAAAA1X+WMw=="
+CUE_IN = "/DAgAAAAAAAAAP/wDwUAAAABf0/+ADLP0AABAAAAAEZdq5s="
+APPLEHEAD = b"com.apple.streaming.transportStreamTimestamp"
+
+
+def _pts_bytes(pts):
+    return bytes(
+        [
+            0x21 | ((pts >> 29) & 0x0E),
+            (pts >> 22) & 0xFF,
+            0x01 | ((pts >> 14) & 0xFE),
+            (pts >> 7) & 0xFF,
+            0x01 | ((pts << 1) & 0xFE),
+        ]
+    )
+
+
+def pes_packet(pts, idr=True, pid=VIDEO_PID):
+    """
+    pes_packet returns a packet that starts a video PES with pts.
+    IDR packets have an adaptation field with PCR and
+    random access flags set.
+    """
+    pkt = bytearray(b"\xff" * PKT_SIZE)
+    pkt[0:3] = bytes([0x47, 0x40 | (pid >> 8), pid & 0xFF])
+    idx = 4
+    pkt[3] = 0x10
+    if idr:
+        pkt[3] = 0x30
+        pkt[4:12] = bytes([7, 0x50, 0, 0, 0, 0, 0, 0])
+        idx = 12
+    pes = bytes([0, 0, 1, 0xE0, 0, 0, 0x80, 0x80, 5]) + _pts_bytes(pts)
+    pkt[idx : idx + len(pes)] = pes
+    return bytes(pkt)
+
+
+def body_packet(pid=VIDEO_PID):
+    """
+    body_packet returns a payload only packet.
+    """
+    pkt = bytearray(b"\xff" * PKT_SIZE)
+    pkt[0:4] = bytes([0x47, pid >> 8, pid & 0xFF, 0x10])
+    return bytes(pkt)
+
+
+def ts_segment(start, duration=6.0, fps=30, gop=30, pkts_per_frame=20):
+    """
+    ts_segment returns (segment bytes, [(idr pts, byte offset), ...])
+    for a segment starting at PTS start, in seconds.
+    Every gop frames is an IDR frame.
+    """
+    out = []
+    idrs = []
+    body = body_packet()
+    for frame in range(int(duration * fps)):
+        ticks = int(round((start + frame / fps) * 90000))
+        idr = frame % gop == 0
+        if idr:
+            idrs.append((round(ticks / 90000.0, 6), len(out) * PKT_SIZE))
+        out.append(pes_packet(ticks, idr))
+        out.extend(body for _ in range(pkts_per_frame - 1))
+    return b"".join(out), idrs
+
+
+def ts_segment_1080p(start, duration=6.0):
+    """
+    ts_segment_1080p returns ts_segment sized like
+    1080p30 video at about 6 Mbps, with two second GOPs.
+    """
+    return ts_segment(start, duration, fps=30, gop=60, pkts_per_frame=133)
+
+
+def aac_segment(start, duration=6.0, frames_per_second=43, frame_size=256):
+    """
+    aac_segment returns an ID3 tagged AAC segment
+    with its PTS in an apple transportStreamTimestamp PRIV frame.
+    """
+    ticks = int(round(start * 90000))
+    priv = APPLEHEAD + b"\x00" + ticks.to_bytes(8, "big")
+    frame = b"PRIV" + len(priv).to_bytes(4, "big") + b"\x00\x00" + priv
+    header = b"ID3\x04\x00\x00" + len(frame).to_bytes(4, "big")
+    adts = b"\xff\xf1\x50\x80" + bytes(frame_size - 4)
+    return header + frame + adts * int(duration * frames_per_second)
+
+
+def media_playlist(names, duration=6.0, msn=0, endlist=True):
+    """
+    media_playlist returns an m3u8 for segment names.
+    """
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{int(round(duration))}",
+        f"#EXT-X-MEDIA-SEQUENCE:{msn}",
+    ]
+    for name in names:
+        lines += [f"#EXTINF:{duration:.6f},", name]
+    if endlist:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def write_rendition(
+    folder, window=10, start=10.0, duration=6.0, msn=0, endlist=True, kind="ts"
+):
+    """
+    write_rendition writes window segments starting at
+    media sequence msn and their index.m3u8 to folder,
+    and returns the index.m3u8 path.
+    Segments already written are kept, so calling it
+    with a higher msn makes a live playlist move forward.
+    """
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for seq in range(msn, msn + window):
+        name = f"seg{seq}.{kind}"
+        names.append(name)
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            continue
+        seg_start = start + seq * duration
+        if kind == "aac":
+            data = aac_segment(seg_start, duration)
+        else:
+            data, _ = ts_segment(seg_start, duration)
+        with open(path, "wb") as seg:
+            seg.write(data)
+    index = os.path.join(folder, "index.m3u8")
+    with open(index, "w", encoding="utf-8") as m3u8:
+        m3u8.write(media_playlist(names, duration, msn, endlist))
+    return index
+
+
+def write_master(folder, renditions=2, **kwargs):
+    """
+    write_master writes a master.m3u8 and
+    renditions rendition directories to folder,
+    and returns the master.m3u8 path.
+    """
+    os.makedirs(folder, exist_ok=True)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for num in range(renditions):
+        write_rendition(os.path.join(folder, str(num)), **kwargs)
+        lines += [
+            f"#EXT-X-STREAM-INF:BANDWIDTH={(num + 1) * 1000000}",
+            f"{num}/index.m3u8",
+        ]
+    master = os.path.join(folder, "master.m3u8")
+    with open(master, "w", encoding="utf-8") as m3u8:
+        m3u8.write("\n".join(lines) + "\n")
+    return master
+
+
+def sidecar_lines(count, start=10.0, step=0.5):
+    """
+    sidecar_lines returns count sidecar lines,
+    alternating CUE-OUT and CUE-IN every step seconds.
+    """
+    lines = []
+    for num in range(count):
+        cue = CUE_OUT if num % 2 == 0 else CUE_IN
+        lines.append(f"{round(start + num * step, 6)},{cue}\n")
+    return lines
+
+
+def write_sidecar(path, count, **kwargs):
+    """
+    write_sidecar writes a sidecar file of count cues.
+    """
+    with open(path, "w", encoding="utf-8") as sidecar:
+        sidecar.writelines(sidecar_lines(count, **kwargs))
+    return path
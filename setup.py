@@ -16,15 +16,17 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/futzu/sideways",
     packages=setuptools.find_packages(),
-    scripts=['bin/sideways'],
+    scripts=['bin/sideways', 'bin/sideways-profile'],
     install_requires=[
         "iframes >= 0.0.7",
         "m3ufu >= 0.0.87",
         "umzz >= 0.0.31",
         "threefive >= 2.4.25",
         "new_reader >= 0.1.7",
+        "pyaes",
         "x9k3 >= 0.2.57",
     ],
+    extras_require={"numpy": ["numpy"], "aes": ["cryptography"]},
     classifiers=[
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
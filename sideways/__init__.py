@@ -2,5 +2,16 @@
 sideways.__init__.py
 """
 
-from .sideways import Segment, Sideways,UMZZnp, argue, cli, do, version
+from .sideways import (
+    Segment,
+    Sideways,
+    UMZZnp,
+    UMZZaio,
+    argue,
+    cli,
+    do,
+    do_aio,
+    version,
+)
+from .engine import AioEngine
 from .splitstream import SplitStream
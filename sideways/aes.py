@@ -0,0 +1,217 @@
+"""
+aes.py
+
+AES-128 segment decryption in memory.
+cryptography is optional, pyaes is used without it.
+"""
+
+import threading
+from collections import OrderedDict
+import pyaes
+from .httppool import reader
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+BLOCK = 16
+# 752 bytes is both whole packets and whole cipher blocks.
+CHUNK = 752 * 16
+QUOTED = ("URI", "KEYFORMAT", "KEYFORMATVERSIONS")
+
+
+def mk_iv(iv, msn=0):
+    """
+    mk_iv returns the 16 byte IV for a segment.
+    iv is a hex string, or an int as m3ufu.TagParser parses it.
+    Without an IV, the media sequence number is the IV.
+    """
+    if iv is None:
+        iv = msn or 0
+    if isinstance(iv, str):
+        iv = int(iv, 16)
+    return int(iv).to_bytes(BLOCK, byteorder="big")
+
+
+def key_tag(key, iv=None, uri=None):
+    """
+    key_tag returns the attributes of an #EXT-X-KEY tag
+    for key, a dict as m3ufu.TagParser parses it,
+    with quoted strings and a hex IV.
+    iv, 16 bytes, is written as the IV when key has none.
+    uri, when set, is written as the URI.
+    """
+    attrs = [f"METHOD={key.get('METHOD', 'NONE')}"]
+    for name, val in key.items():
+        if name == "METHOD":
+            continue
+        if name == "URI" and uri:
+            val = uri
+        if name == "IV" and isinstance(val, int):
+            val = f"0x{val:032X}"
+        elif name in QUOTED:
+            val = f'"{val}"'
+        attrs.append(f"{name}={val}")
+    if iv is not None and "IV" not in key and key.get("METHOD") != "NONE":
+        attrs.append(f"IV=0x{iv.hex().upper()}")
+    return ",".join(attrs)
+
+
+def unpad(plain):
+    """
+    unpad strips PKCS#7 padding from plain.
+    plain is returned as it is when the last n bytes
+    are not all n.
+    """
+    if not plain:
+        return plain
+    pad = plain[-1]
+    if 0 < pad <= BLOCK <= len(plain) and plain[-pad:] == bytes([pad]) * pad:
+        return plain[:-pad]
+    return plain
+
+
+class _PyaesCBC:
+    """
+    _PyaesCBC is pyaes CBC decryption with
+    the update_into of a cryptography decryptor.
+    """
+
+    def __init__(self, key, iv):
+        self.mode = pyaes.AESModeOfOperationCBC(key, iv=iv)
+
+    def update_into(self, data, out):
+        decrypt = self.mode.decrypt
+        for idx in range(0, len(data), BLOCK):
+            out[idx : idx + BLOCK] = decrypt(bytes(data[idx : idx + BLOCK]))
+        return len(data)
+
+
+def _decryptor(key, iv):
+    if Cipher:
+        return Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+    return _PyaesCBC(key, iv)
+
+
+class KeyCache:
+    """
+    KeyCache is an LRU cache of AES-128 keys keyed by URI,
+    so a key is fetched once, not once for every segment.
+    """
+
+    def __init__(self, keep=16):
+        self.keep = keep
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.fetches = 0
+
+    def get(self, uri):
+        """
+        get returns the key for uri,
+        fetching it on a miss.
+        """
+        with self.lock:
+            key = self.items.get(uri)
+            if key is not None:
+                self.items.move_to_end(uri)
+                self.hits += 1
+                return key
+        with reader(uri) as quay:
+            key = quay.read()
+        if len(key) != BLOCK:
+            raise ValueError(f"bad AES-128 key at {uri}, {len(key)} bytes")
+        with self.lock:
+            self.fetches += 1
+            self.items[uri] = key
+            while len(self.items) > self.keep:
+                self.items.popitem(last=False)
+        return key
+
+    def stats(self):
+        """
+        stats returns the key counters as a dict.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "fetches": self.fetches,
+                "items": len(self.items),
+            }
+
+
+KEYS = KeyCache()
+
+
+class AesDecrypter:
+    """
+    AesDecrypter decrypts AES-128 segments in memory.
+    Whole segments are decrypted into one buffer
+    that is reused from segment to segment.
+    For probing, only the leading blocks are decrypted,
+    a chunk at a time.
+    Encrypted bytes come from cache, a SegmentCache,
+    when there is one. Keys come from keys, a KeyCache,
+    shared by every rendition in the process by default.
+    """
+
+    def __init__(self, keys=None, cache=None):
+        self.keys = keys or KEYS
+        self.cache = cache
+        self.buf = bytearray()
+        self.decrypted = 0
+
+    def _encrypted(self, media):
+        if self.cache and media.startswith("http"):
+            return self.cache.get(media)
+        with reader(media) as infile:
+            return infile.read()
+
+    def decrypt(self, media, key_uri, iv):
+        """
+        decrypt returns the plaintext of media as a memoryview
+        of the reused buffer, good until the next decrypt.
+        """
+        data = self._encrypted(media)
+        size = len(data) - len(data) % BLOCK
+        if len(self.buf) < size + BLOCK:
+            self.buf = bytearray(size + BLOCK)
+        decryptor = _decryptor(self.keys.get(key_uri), iv)
+        size = decryptor.update_into(memoryview(data)[:size], self.buf)
+        self.decrypted += size
+        return unpad(memoryview(self.buf)[:size])
+
+    def _chunks(self, media):
+        if self.cache:
+            data = self.cache.peek(media)
+            if data is not None:
+                for idx in range(0, len(data), CHUNK):
+                    yield data[idx : idx + CHUNK]
+                return
+        with reader(media) as infile:
+            for chunk in iter(lambda: infile.read(CHUNK), b""):
+                yield chunk
+
+    def leading(self, media, key_uri, iv):
+        """
+        leading yields the plaintext of media a chunk at a time,
+        decrypting only as much as is read.
+        Chunks are whole packets, padding is left in the last one.
+        """
+        decryptor = _decryptor(self.keys.get(key_uri), iv)
+        out = bytearray(CHUNK + BLOCK)
+        pending = bytearray()
+        for chunk in self._chunks(media):
+            pending += chunk
+            while len(pending) >= CHUNK:
+                yield self._update(decryptor, pending[:CHUNK], out)
+                del pending[:CHUNK]
+        size = len(pending) - len(pending) % BLOCK
+        if size:
+            yield self._update(decryptor, pending[:size], out)
+
+    def _update(self, decryptor, data, out):
+        size = decryptor.update_into(data, out)
+        self.decrypted += size
+        return bytes(out[:size])
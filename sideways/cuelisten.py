@@ -0,0 +1,248 @@
+"""
+cuelisten.py
+"""
+
+import base64
+import socket
+import socketserver
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from .cueschedule import CueSchedule
+from .log import LOGGER
+
+SCHEMES = ("udp", "tcp", "http")
+UDP_RCVBUF = 1 << 20
+
+
+def normalize_cue(raw):
+    """
+    normalize_cue returns a base64, hex or binary
+    SCTE-35 cue as base64.
+    """
+    if isinstance(raw, (bytes, bytearray)) and raw[:1] == b"\xfc":
+        return base64.b64encode(bytes(raw)).decode()
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode(errors="ignore")
+    cue = raw.strip()
+    hexed = cue[2:] if cue[:2].lower() == "0x" else cue
+    if hexed[:2].lower() == "fc":
+        try:
+            return base64.b64encode(bytes.fromhex(hexed)).decode()
+        except ValueError:
+            pass
+    return cue
+
+
+def parse_url(url):
+    """
+    parse_url splits "scheme://host:port" into
+    (scheme, host, port). host defaults to 127.0.0.1.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in SCHEMES or parts.port is None:
+        raise ValueError(f"listen url must be udp, tcp or http://host:port not {url}")
+    return parts.scheme, parts.hostname or "127.0.0.1", parts.port
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+    listener = None
+
+    def handle(self):
+        data, sock = self.request
+        sock.sendto(self.listener.datagram(data), self.client_address)
+
+
+class _UDPServer(socketserver.UDPServer):
+    allow_reuse_address = True
+    max_packet_size = 65535
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RCVBUF)
+        super().server_bind()
+
+
+class _TCPHandler(socketserver.StreamRequestHandler):
+    listener = None
+
+    def handle(self):
+        for line in self.rfile:
+            self.wfile.write(self.listener.lines(line))
+            self.wfile.flush()
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    listener = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        """
+        do_POST accepts pts,cue lines, or with
+        Content-Type application/octet-stream,
+        one binary cue and ?pts= in the url.
+        """
+        size = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(size)
+        if self.headers.get("Content-Type") == "application/octet-stream":
+            query = parse_qs(urlsplit(self.path).query)
+            insert_pts = query.get("pts", ["0"])[0].encode()
+            acks = self.listener.datagram(insert_pts + b"," + body)
+        else:
+            acks = self.listener.lines(body)
+        status = 400 if acks.startswith(b"ERR") else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(acks)))
+        self.end_headers()
+        self.wfile.write(acks)
+
+
+class CueListener:
+    """
+    CueListener accepts pts,cue messages over udp, tcp
+    or http POST, and hands each cue to sink.
+    sink is called with (insert_pts, cue) and returns False
+    for duplicates, or raises ValueError for bad cues.
+    Cues are base64, hex or binary SCTE-35.
+    Every cue is acknowledged with a line,
+    OK pts, DUP pts or ERR reason.
+    """
+
+    def __init__(self, sink, urls):
+        self.sink = sink
+        self.urls = list(urls)
+        self.servers = []
+        self.accepted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def accept(self, insert_pts, raw):
+        """
+        accept hands one cue to sink
+        and returns its acknowledgement.
+        """
+        try:
+            cue = normalize_cue(raw)
+            fresh = self.sink(insert_pts, cue)
+        except ValueError as err:
+            with self.lock:
+                self.rejected += 1
+            return f"ERR {err}\n"
+        with self.lock:
+            if fresh is False:
+                self.duplicates += 1
+                return f"DUP {insert_pts}\n"
+            self.accepted += 1
+        return f"OK {insert_pts}\n"
+
+    def lines(self, data):
+        """
+        lines accepts newline separated pts,cue lines.
+        """
+        acks = []
+        for line in data.splitlines():
+            try:
+                parsed = CueSchedule.parse_line(line)
+            except ValueError as err:
+                acks.append(f"ERR {err}\n")
+                continue
+            if parsed:
+                acks.append(self.accept(*parsed))
+        return "".join(acks).encode()
+
+    def datagram(self, data):
+        """
+        datagram accepts one pts,binary cue message,
+        or pts,cue lines.
+        """
+        head, sep, tail = data.partition(b",")
+        if sep and tail[:1] == b"\xfc":
+            try:
+                insert_pts = float(head)
+            except ValueError:
+                return f"ERR bad pts {head[:32]}\n".encode()
+            return self.accept(insert_pts, tail).encode()
+        return self.lines(data)
+
+    def _mk_server(self, scheme, host, port):
+        if scheme == "udp":
+            handler = type("Handler", (_UDPHandler,), {"listener": self})
+            return _UDPServer((host, port), handler)
+        if scheme == "tcp":
+            handler = type("Handler", (_TCPHandler,), {"listener": self})
+            return _TCPServer((host, port), handler)
+        handler = type("Handler", (_HTTPHandler,), {"listener": self})
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        return server
+
+    def start(self):
+        """
+        start runs a server in a daemon thread for each url.
+        """
+        for url in self.urls:
+            scheme, host, port = parse_url(url)
+            server = self._mk_server(scheme, host, port)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self.servers.append(server)
+            port = server.server_address[1]
+            LOGGER.info("Cue listener on %s://%s:%s", scheme, host, port)
+
+    def stop(self):
+        """
+        stop shuts the servers down.
+        """
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+    def stats(self):
+        """
+        stats returns the cue counters as a dict.
+        """
+        with self.lock:
+            return {
+                "accepted": self.accepted,
+                "duplicates": self.duplicates,
+                "rejected": self.rejected,
+            }
+
+
+def send(url, message, timeout=2.0):
+    """
+    send sends message, bytes of pts,cue lines or
+    one pts,binary cue, to a CueListener at url
+    and returns the acknowledgements.
+    """
+    scheme, host, port = parse_url(url)
+    if scheme == "http":
+        req = urllib.request.Request(f"http://{host}:{port}/", data=message)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return resp.read()
+        except urllib.error.HTTPError as err:
+            return err.read()
+    if scheme == "udp":
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            sock.sendto(message, (host, port))
+            return sock.recv(65535)
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(message)
+        sock.shutdown(socket.SHUT_WR)
+        acks = b""
+        for chunk in iter(lambda: sock.recv(65535), b""):
+            acks += chunk
+        return acks
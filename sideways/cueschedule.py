@@ -0,0 +1,115 @@
+"""
+cueschedule.py
+"""
+
+from bisect import bisect_left, bisect_right
+from threefive import Cue
+
+
+class CueSchedule:
+    """
+    CueSchedule holds sidecar cues sorted by insert PTS.
+    Cues are decoded once, when they are added,
+    duplicates are dropped with a set lookup,
+    and cues in a PTS range are found with a binary search.
+    """
+
+    def __init__(self):
+        self.pts = []
+        self.entries = []
+        self.keys = set()
+        self.pruned = 0
+
+    def __len__(self):
+        return len(self.pts)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    @staticmethod
+    def parse_line(line):
+        """
+        parse_line returns (insert_pts, cue) from
+        a sidecar line, or None for blank and comment lines.
+        Raises ValueError for lines that do not parse.
+        """
+        if isinstance(line, bytes):
+            line = line.decode(errors="ignore")
+        line = line.strip().split("#", 1)[0]
+        if not line:
+            return None
+        if "," not in line:
+            raise ValueError(f"bad sidecar line {line}")
+        insert_pts, cue = line.split(",", 1)
+        try:
+            return float(insert_pts), cue.strip()
+        except ValueError as err:
+            raise ValueError(f"bad sidecar line {line}") from err
+
+    @staticmethod
+    def decode(cue):
+        """
+        decode returns cue as a decoded threefive.Cue,
+        or raises ValueError.
+        """
+        try:
+            decoded = Cue(cue)
+        except Exception as err:
+            raise ValueError(f"bad cue {cue}") from err
+        if not decoded.command:
+            raise ValueError(f"bad cue {cue}")
+        return decoded
+
+    def add(self, insert_pts, cue, decoded=None):
+        """
+        add schedules cue at insert_pts,
+        decoding it unless decoded is passed in.
+        Returns False for duplicates,
+        raises ValueError for cues that do not decode.
+        """
+        key = (insert_pts, cue)
+        if key in self.keys:
+            return False
+        if decoded is None:
+            decoded = self.decode(cue)
+        idx = bisect_right(self.pts, insert_pts)
+        self.pts.insert(idx, insert_pts)
+        self.entries.insert(idx, (insert_pts, cue, decoded))
+        self.keys.add(key)
+        return True
+
+    def _range(self, lo, hi):
+        return bisect_left(self.pts, lo), bisect_right(self.pts, hi)
+
+    def between(self, lo, hi):
+        """
+        between returns the (insert_pts, cue, decoded) entries
+        with lo <= insert_pts <= hi.
+        """
+        start, stop = self._range(lo, hi)
+        return self.entries[start:stop]
+
+    def _pop(self, start, stop):
+        popped = self.entries[start:stop]
+        del self.pts[start:stop]
+        del self.entries[start:stop]
+        for insert_pts, cue, _ in popped:
+            self.keys.discard((insert_pts, cue))
+        return popped
+
+    def pop_between(self, lo, hi):
+        """
+        pop_between removes and returns the entries
+        with lo <= insert_pts <= hi.
+        """
+        return self._pop(*self._range(lo, hi))
+
+    def prune(self, before):
+        """
+        prune drops entries with insert_pts before before,
+        cues that can no longer be inserted.
+        Returns the dropped entries.
+        """
+        stop = bisect_left(self.pts, before)
+        self.pruned += stop
+        return self._pop(0, stop)
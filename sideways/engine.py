@@ -0,0 +1,96 @@
+"""
+engine.py
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AioEngine:
+    """
+    AioEngine runs Sideways renditions as coroutines
+    in one process, instead of one process per rendition.
+    Blocking reloads, probes and splits
+    run in a bounded thread pool.
+    Renditions from any number of master playlists
+    can be added to one AioEngine.
+    initializer, if set, is called in each pool thread
+    when it starts.
+    """
+
+    def __init__(self, workers=4, interval=0.2):
+        self.workers = workers
+        self.interval = interval
+        self.renditions = []
+        self.watchers = []
+        self.running = False
+        self.initializer = None
+
+    def add(self, sway):
+        """
+        add adds a Sideways instance.
+        """
+        self.renditions.append(sway)
+
+    def watch(self, func):
+        """
+        watch adds a function that is called
+        every interval while renditions are running,
+        like UMZZ._chk_master_sidecar.
+        """
+        self.watchers.append(func)
+
+    @staticmethod
+    async def _rendition(loop, pool, sway):
+        """
+        _rendition steps one Sideways instance until it stops reloading.
+        A step that fails is logged and retried after reload_delay,
+        only a failed setup stops the rendition.
+        The rendition is closed when it stops.
+        """
+        try:
+            await loop.run_in_executor(pool, sway.setup)
+        except Exception as err:
+            sway.log.error("stopped: %s", err)
+            sway.close()
+            return
+        try:
+            while sway.reload:
+                started = time.monotonic()
+                try:
+                    delay = await loop.run_in_executor(pool, sway.step)
+                except Exception as err:
+                    sway.log.warning("reload failed, retrying: %s", err)
+                    sway.metrics.inc("step_errors_total")
+                    delay = sway.reload_delay(started)
+                await asyncio.sleep(delay)
+        finally:
+            sway.close()
+
+    async def _watcher(self, func):
+        while self.running:
+            func()
+            await asyncio.sleep(self.interval)
+
+    async def run_async(self):
+        """
+        run_async runs every rendition until all of them stop.
+        """
+        loop = asyncio.get_running_loop()
+        self.running = True
+        with ThreadPoolExecutor(
+            max_workers=self.workers, initializer=self.initializer
+        ) as pool:
+            watchers = [asyncio.create_task(self._watcher(f)) for f in self.watchers]
+            await asyncio.gather(
+                *[self._rendition(loop, pool, sway) for sway in self.renditions]
+            )
+            self.running = False
+            await asyncio.gather(*watchers)
+
+    def run(self):
+        """
+        run runs the engine.
+        """
+        asyncio.run(self.run_async())
@@ -0,0 +1,234 @@
+"""
+httppool.py
+"""
+
+import http.client
+import os
+import threading
+import urllib.request
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+from new_reader import reader as new_reader
+
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+STALE = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class PooledResponse:
+    """
+    PooledResponse is an http response that reads like
+    the file handle new_reader.reader returns.
+    Closing it hands the connection back to the pool.
+    """
+
+    def __init__(self, pool, key, conn, resp, url):
+        self.pool = pool
+        self.key = key
+        self.conn = conn
+        self.resp = resp
+        self.url = url
+        self.status = resp.status
+        self.headers = resp.headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def read(self, amt=None):
+        return self.resp.read(amt)
+
+    def readline(self, limit=-1):
+        return self.resp.readline(limit)
+
+    def readlines(self):
+        return list(self)
+
+    def getcode(self):
+        return self.status
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if self.conn is None:
+            return
+        done = self.resp.isclosed() or self.resp.length == 0
+        reusable = done and not self.resp.will_close
+        self.resp.close()
+        self.pool.release(self.key, self.conn, reusable)
+        self.conn = None
+
+
+class HttpPool:
+    """
+    HttpPool keeps http and https connections alive
+    and reuses them, with at most per_host connections
+    open to each host.
+    Connections are reused when a response is read to the end.
+    Requests that go through a proxy use new_reader.reader.
+    """
+
+    def __init__(self, per_host=8, timeout=60):
+        self.per_host = per_host
+        self.timeout = timeout
+        self._reset()
+
+    def _reset(self):
+        """
+        _reset drops all connections,
+        a forked process must not share them.
+        """
+        self.idle = {}
+        self.slots = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connects = 0
+        self.reuses = 0
+        self.retries = 0
+
+    def _new_conn(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _slot(self, key):
+        with self.lock:
+            if key not in self.slots:
+                self.slots[key] = threading.BoundedSemaphore(self.per_host)
+                self.idle[key] = []
+            return self.slots[key]
+
+    def _connect(self, key):
+        """
+        _connect returns an idle connection for key,
+        or a new one, and if it was reused.
+        """
+        with self.lock:
+            if self.idle[key]:
+                self.reuses += 1
+                return self.idle[key].pop(), True
+            self.connects += 1
+        return self._new_conn(key), False
+
+    def release(self, key, conn, reusable):
+        """
+        release hands a connection back to the pool.
+        """
+        if reusable:
+            with self.lock:
+                self.idle[key].append(conn)
+        else:
+            conn.close()
+        self.slots[key].release()
+
+    def _send(self, key, path, headers):
+        """
+        _send sends a GET on a pooled connection,
+        retrying once on a new connection if
+        a reused one was closed by the server.
+        """
+        conn, reused = self._connect(key)
+        try:
+            conn.request("GET", path, headers=headers)
+            return conn, conn.getresponse()
+        except STALE:
+            conn.close()
+            if not reused:
+                raise
+        except Exception:
+            conn.close()
+            raise
+        with self.lock:
+            self.retries += 1
+            self.connects += 1
+        conn = self._new_conn(key)
+        try:
+            conn.request("GET", path, headers=headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def get(self, url, headers=None):
+        """
+        get returns a PooledResponse for url,
+        following redirects. Like urllib, responses
+        that are not 2xx raise urllib.error.HTTPError.
+        """
+        headers = dict(headers or {})
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            scheme = parts.scheme
+            port = parts.port or (443 if scheme == "https" else 80)
+            key = (scheme, parts.hostname, port)
+            path = parts.path or "/"
+            if parts.query:
+                path += "?" + parts.query
+            slot = self._slot(key)
+            slot.acquire()
+            with self.lock:
+                self.requests += 1
+            try:
+                conn, resp = self._send(key, path, headers)
+            except Exception:
+                slot.release()
+                raise
+            pooled = PooledResponse(self, key, conn, resp, url)
+            if 200 <= resp.status < 300:
+                return pooled
+            resp.read()
+            pooled.close()
+            location = resp.headers.get("Location")
+            if resp.status in REDIRECTS and location:
+                url = urljoin(url, location)
+                continue
+            raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+        raise HTTPError(url, resp.status, "too many redirects", resp.headers, None)
+
+    def reader(self, uri, headers={}):
+        """
+        reader is new_reader.reader with pooled
+        connections for http(s) uris.
+        """
+        if not isinstance(uri, str) or not uri.startswith("http"):
+            return new_reader(uri, headers=headers)
+        if urlsplit(uri).scheme in urllib.request.getproxies():
+            return new_reader(uri, headers=headers)
+        return self.get(uri, headers)
+
+    def stats(self):
+        """
+        stats returns the connection counters as a dict.
+        """
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "connects": self.connects,
+                "reuses": self.reuses,
+                "retries": self.retries,
+                "idle": sum(len(conns) for conns in self.idle.values()),
+            }
+
+
+POOL = HttpPool()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=POOL._reset)
+
+
+def reader(uri, headers={}):
+    """
+    reader reads uri through the process wide HttpPool.
+    """
+    return POOL.reader(uri, headers)
@@ -0,0 +1,198 @@
+"""
+log.py
+"""
+
+import datetime
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+ON = "\033[1m"
+OFF = "\033[0m"
+
+LOGGER = logging.getLogger("sideways")
+LEVELS = ("debug", "info", "warning", "error")
+
+_RECORD_ATTRS = set(
+    logging.LogRecord("", logging.INFO, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "rendition", "suppressed"}
+
+
+class RateLimit(logging.Filter):
+    """
+    RateLimit lets through at most rate records a second,
+    with bursts of up to rate, for each rendition and level.
+    Warnings and errors are never dropped.
+    The next record let through after some were dropped
+    carries the count in record.suppressed.
+    A rate of 0 lets everything through.
+    """
+
+    def __init__(self, rate=5):
+        super().__init__()
+        self.rate = rate
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if not self.rate or record.levelno >= logging.WARNING:
+            return True
+        key = (getattr(record, "rendition", None), record.levelno)
+        now = time.monotonic()
+        with self.lock:
+            tokens, last, dropped = self.buckets.get(key, (self.rate, now, 0))
+            tokens = min(self.rate, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self.buckets[key] = (tokens, now, dropped + 1)
+                return False
+            self.buckets[key] = (tokens - 1, now, 0)
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class ConsoleFormatter(logging.Formatter):
+    """
+    ConsoleFormatter formats records as lines
+    prefixed with the rendition, in bold when color is set.
+    """
+
+    def __init__(self, color=False):
+        super().__init__()
+        self.color = color
+
+    def _bold(self, text):
+        if self.color:
+            return f"{ON}{text}{OFF}"
+        return text
+
+    def format(self, record):
+        line = record.getMessage()
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            line += f" ({suppressed} similar suppressed)"
+        if record.levelno >= logging.WARNING:
+            line = self._bold(f"{record.levelname} {line}")
+        rendition = getattr(record, "rendition", None)
+        if rendition is not None:
+            line = f"{self._bold(f'proc: {rendition}')} {line}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    JsonFormatter formats records as one JSON object per line.
+    Fields passed with extra are included.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname.lower(),
+            "pid": record.process,
+            "rendition": getattr(record, "rendition", None),
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        for key, val in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = val
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RenditionLog(logging.LoggerAdapter):
+    """
+    RenditionLog labels records with the rendition,
+    keeping fields passed with extra.
+    """
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+
+def rendition_log(rendition=None):
+    """
+    rendition_log returns a RenditionLog for rendition.
+    """
+    return RenditionLog(LOGGER, {"rendition": rendition})
+
+
+def log_level(args):
+    """
+    log_level returns the logging level
+    for --log_level and --quiet.
+    """
+    if getattr(args, "quiet", False):
+        return logging.WARNING
+    return getattr(logging, str(getattr(args, "log_level", "info")).upper())
+
+
+def worker_logging(log_queue, args):
+    """
+    worker_logging sends the records of this process
+    to log_queue, rate limited, instead of writing them.
+    Putting a record on the queue never waits on stdout.
+    worker_logging returns the QueueHandler.
+    """
+    for handler in list(LOGGER.handlers):
+        LOGGER.removeHandler(handler)
+    handler = QueueHandler(log_queue)
+    handler.addFilter(RateLimit(getattr(args, "log_rate", 5)))
+    LOGGER.addHandler(handler)
+    LOGGER.setLevel(log_level(args))
+    LOGGER.propagate = False
+    return handler
+
+
+class LogWriter:
+    """
+    LogWriter writes the records that rendition processes
+    and coroutines put on queue to stdout, in a thread
+    of the parent process, as lines or JSON.
+    """
+
+    def __init__(self, args, log_queue=None):
+        self.queue = log_queue if log_queue is not None else queue.SimpleQueue()
+        handler = logging.StreamHandler(sys.stdout)
+        if getattr(args, "json_log", False):
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(ConsoleFormatter(color=sys.stdout.isatty()))
+        self.listener = QueueListener(self.queue, handler)
+        self.args = args
+        self.handler = None
+        self.running = False
+
+    def start(self):
+        """
+        start starts writing, and sends the records
+        of this process to the queue.
+        """
+        self.handler = worker_logging(self.queue, self.args)
+        self.listener.start()
+        self.running = True
+        return self
+
+    def stop(self):
+        """
+        stop writes the records left on the queue
+        and stops writing.
+        """
+        if self.running:
+            self.running = False
+            LOGGER.removeHandler(self.handler)
+            LOGGER.propagate = True
+            self.listener.stop()
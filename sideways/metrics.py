@@ -0,0 +1,284 @@
+"""
+metrics.py
+"""
+
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .log import LOGGER
+
+PREFIX = "sideways_"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+METRICS = {
+    "playlist_reloads_total": ("counter", "Rendition playlist reloads."),
+    "playlist_unchanged_total": (
+        "counter",
+        "Reloads that found the playlist unchanged.",
+    ),
+    "step_errors_total": ("counter", "Reloads that failed and were retried."),
+    "playlist_fetch_seconds": ("histogram", "Time to fetch a rendition playlist."),
+    "reload_interval_seconds": ("histogram", "Time between playlist reloads."),
+    "segments_total": ("counter", "Segments added to the rendition m3u8."),
+    "probe_seconds": ("histogram", "Time to probe a segment for PTS."),
+    "probe_bytes_total": ("counter", "Bytes read to probe segments for PTS."),
+    "split_seconds": ("histogram", "Time to split a segment."),
+    "split_bytes_total": ("counter", "Bytes of segments split."),
+    "manifest_write_seconds": (
+        "histogram",
+        "Time to render and write a rendition m3u8.",
+    ),
+    "cues_total": ("counter", "SCTE-35 cues inserted."),
+    "cue_publish_seconds": (
+        "histogram",
+        "Time from a cue being due, or received if later, to the m3u8 with it being published.",
+    ),
+    "live_edge_lag_seconds": (
+        "gauge",
+        "Time from the source playlist changing to the rendition m3u8 being published.",
+    ),
+}
+
+
+class Metrics:
+    """
+    Metrics holds the counters, gauges and histograms
+    of one rendition, labeled with labels.
+    Histograms count observations in BUCKETS.
+    """
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1):
+        """
+        inc adds amount to a counter.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name, value):
+        """
+        set sets a gauge.
+        """
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        """
+        observe adds value to a histogram.
+        """
+        with self.lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            hist[0][bisect_left(BUCKETS, value)] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    @contextmanager
+    def timer(self, name):
+        """
+        timer observes the seconds spent in a with block.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started)
+
+    def snapshot(self):
+        """
+        snapshot returns a copy of the metrics
+        that can be sent to another process.
+        """
+        with self.lock:
+            return {
+                "labels": dict(self.labels),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {
+                    name: (list(counts), total, count)
+                    for name, (counts, total, count) in self.histograms.items()
+                },
+            }
+
+
+def _label_str(labels, extra=None):
+    pairs = list(labels.items())
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    quoted = []
+    for key, val in pairs:
+        val = str(val).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        quoted.append(f'{key}="{val}"')
+    return "{" + ",".join(quoted) + "}"
+
+
+def render(snapshots):
+    """
+    render returns snapshots in the
+    Prometheus text exposition format.
+    """
+    lines = []
+    for name, (kind, text) in METRICS.items():
+        full = PREFIX + name
+        samples = []
+        for snap in snapshots:
+            labels = snap["labels"]
+            if kind == "histogram":
+                if name not in snap["histograms"]:
+                    continue
+                counts, total, count = snap["histograms"][name]
+                running = 0
+                for bound, bucket in zip(BUCKETS + ("+Inf",), counts):
+                    running += bucket
+                    le = _label_str(labels, ("le", bound))
+                    samples.append(f"{full}_bucket{le} {running}")
+                samples.append(f"{full}_sum{_label_str(labels)} {total}")
+                samples.append(f"{full}_count{_label_str(labels)} {count}")
+                continue
+            values = snap["counters"] if kind == "counter" else snap["gauges"]
+            if name in values:
+                samples.append(f"{full}{_label_str(labels)} {values[name]}")
+        if samples:
+            lines.append(f"# HELP {full} {text}")
+            lines.append(f"# TYPE {full} {kind}")
+            lines.extend(samples)
+    return ("\n".join(lines) + "\n").encode()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    hub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        """
+        do_GET serves the metrics at any path.
+        """
+        body = self.hub.render()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsHub:
+    """
+    MetricsHub collects the metrics of every rendition
+    in the parent process.
+    Rendition processes send snapshots on a queue,
+    renditions in the same process are added directly.
+    target is [host:]port to serve the metrics over http,
+    or a file path to write them to, at most once per interval.
+    """
+
+    def __init__(self, target, interval=1.0):
+        self.target = str(target)
+        self.interval = interval
+        self.address = self.parse_address(self.target)
+        self.snapshots = {}
+        self.sources = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.written = 0
+
+    @staticmethod
+    def parse_address(target):
+        """
+        parse_address returns (host, port) for "[host:]port",
+        or None for a file path.
+        """
+        host, _, port = target.rpartition(":")
+        if not port.isdigit() or "/" in host:
+            return None
+        return host or "127.0.0.1", int(port)
+
+    def add(self, metrics):
+        """
+        add collects metrics, a Metrics in this process.
+        """
+        with self.lock:
+            self.sources.append(metrics)
+
+    def update(self, snapshot):
+        """
+        update keeps the latest snapshot from a rendition.
+        """
+        key = tuple(sorted(snapshot["labels"].items()))
+        with self.lock:
+            self.snapshots[key] = snapshot
+
+    def drain(self, metrics_queue):
+        """
+        drain updates from every snapshot waiting on metrics_queue.
+        """
+        while True:
+            try:
+                self.update(metrics_queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def render(self):
+        """
+        render returns the metrics of every rendition
+        in the Prometheus text format.
+        """
+        with self.lock:
+            snapshots = list(self.snapshots.values())
+            sources = list(self.sources)
+        snapshots += [metrics.snapshot() for metrics in sources]
+        return render(snapshots)
+
+    def start(self):
+        """
+        start serves the metrics over http in a daemon thread,
+        when target is an address.
+        """
+        if self.server or not self.address:
+            return
+        handler = type("Handler", (_MetricsHandler,), {"hub": self})
+        self.server = ThreadingHTTPServer(self.address, handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address[:2]
+        LOGGER.info("Metrics on http://%s:%s/metrics", host, port)
+
+    def publish(self, force=False):
+        """
+        publish writes the metrics file,
+        when target is a file path.
+        """
+        if self.address:
+            return
+        now = time.monotonic()
+        if not force and now - self.written < self.interval:
+            return
+        self.written = now
+        tmp = f"{self.target}.tmp"
+        with open(tmp, "wb") as prom:
+            prom.write(self.render())
+        os.replace(tmp, self.target)
+
+    def stop(self):
+        """
+        stop shuts the server down.
+        """
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
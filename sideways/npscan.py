@@ -0,0 +1,71 @@
+"""
+npscan.py
+
+Vectorized random access point scanning with numpy.
+numpy is optional, scan is None without it.
+"""
+
+from iframes import IFramer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PKT_SIZE = 188
+NAL = (0x00, 0x00, 0x01, 0x65)
+
+
+def _has_nal(rows):
+    """
+    _has_nal is IFramer._nal for each row of packets.
+    """
+    found = np.ones((rows.shape[0], PKT_SIZE - 3), dtype=bool)
+    for shift, byte in enumerate(NAL):
+        found &= rows[:, shift : PKT_SIZE - 3 + shift] == byte
+    return found.any(axis=1)
+
+
+def _candidates(pkts):
+    """
+    _candidates returns the packet numbers that
+    IFramer._pusi_flag and IFramer._is_key accept.
+    """
+    pusi = np.flatnonzero(pkts[:, 1] & 0x40)
+    rows = pkts[pusi]
+    afc = (rows[:, 3] & 0x20) != 0
+    flags = rows[:, 5]
+    pcr_rai = (flags & 0x50) == 0x50
+    abc = (flags & 0xA8) != 0
+    key = afc & (pcr_rai | abc)
+    maybe = ~key
+    if maybe.any():
+        key[maybe] = _has_nal(rows[maybe])
+    return pusi[key]
+
+
+def _scan(buf):
+    """
+    _scan returns ([pts, ...], [offset, ...]) for every packet
+    in buf that IFramer.parse returns a PTS for.
+    Only the candidate packets are parsed for PTS in python.
+    """
+    count = len(buf) // PKT_SIZE
+    if not count:
+        return [], []
+    pkts = np.frombuffer(buf, dtype=np.uint8, count=count * PKT_SIZE)
+    pkts = pkts.reshape(count, PKT_SIZE)
+    framer = IFramer(shush=True)
+    found_pts = []
+    offsets = []
+    for num in _candidates(pkts).tolist():
+        pts = framer._parse_pts(pkts[num].tobytes())
+        if pts:
+            pts = framer._to90k(pts)
+        if pts:
+            found_pts.append(pts)
+            offsets.append(num * PKT_SIZE)
+    return found_pts, offsets
+
+
+scan = _scan if np is not None else None
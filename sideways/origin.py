@@ -0,0 +1,173 @@
+"""
+origin.py
+"""
+
+import os
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from .log import LOGGER
+
+MIME_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".aac": "audio/aac",
+    ".ac3": "audio/ac3",
+}
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    """
+    OriginHandler serves rendition m3u8s from memory
+    and everything else from files under Origin.root.
+    """
+
+    origin = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", ctype="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _playlist(self, sway, query):
+        msn = None
+        if "_HLS_msn" in query:
+            try:
+                msn = int(query["_HLS_msn"][0])
+            except ValueError:
+                return self._send(400, b"bad _HLS_msn")
+        status, body = self.origin.playlist(sway, msn)
+        return self._send(status, body, MIME_TYPES[".m3u8"])
+
+    def _file(self, path):
+        local = self.origin.local_path(path)
+        if not local:
+            return self._send(404, b"not found")
+        ext = os.path.splitext(local)[1]
+        with open(local, "rb") as media:
+            self.send_response(200)
+            self.send_header(
+                "Content-Type", MIME_TYPES.get(ext, "application/octet-stream")
+            )
+            self.send_header("Content-Length", str(os.fstat(media.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(media, self.wfile)
+        return None
+
+    def do_GET(self):
+        """
+        do_GET routes GET requests.
+        """
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        sway = self.origin.renditions.get(path)
+        if sway:
+            return self._playlist(sway, parse_qs(url.query))
+        return self._file(path)
+
+
+class Origin:
+    """
+    Origin is an embedded http server.
+    It serves each rendition m3u8 from its in-memory render,
+    and the master.m3u8 and split segments from files under root.
+    Rendition m3u8s support blocking playlist reload with _HLS_msn.
+    """
+
+    def __init__(self, root, address="127.0.0.1:8080"):
+        self.root = os.path.realpath(root)
+        self.host, self.port = self.parse_address(address)
+        self.renditions = {}
+        self.cond = threading.Condition()
+        self.server = None
+        self.thread = None
+
+    @staticmethod
+    def parse_address(address):
+        """
+        parse_address splits "host:port" or "port"
+        """
+        address = str(address)
+        host = "127.0.0.1"
+        if ":" in address:
+            host, address = address.rsplit(":", 1)
+        return host, int(address)
+
+    def add(self, sway):
+        """
+        add serves the m3u8 of a Sideways instance
+        at its path relative to root.
+        """
+        out = os.path.realpath(sway.mk_uri(sway.args.output_dir, sway.outfile))
+        path = "/" + os.path.relpath(out, self.root).replace(os.sep, "/")
+        self.renditions[path] = sway
+        sway.origin = self
+        return path
+
+    def publish(self):
+        """
+        publish wakes blocked playlist requests.
+        Sideways.write_m3u8 calls it after each render.
+        """
+        with self.cond:
+            self.cond.notify_all()
+
+    def playlist(self, sway, msn=None):
+        """
+        playlist returns (status, body) for a rendition.
+        With msn, it blocks until the m3u8 has
+        media sequence msn, for three target durations.
+        """
+        if msn is not None:
+            last = sway.last_seq()
+            if last is not None and msn > last + 2:
+                return 400, b"_HLS_msn too far ahead"
+            hold = sway.target_duration() * 3
+            with self.cond:
+                if not self.cond.wait_for(lambda: sway.has_seq(msn), hold):
+                    return 503, b"_HLS_msn not available"
+        if not sway.rendered:
+            return 503, b"not ready"
+        return 200, sway.rendered
+
+    def local_path(self, path):
+        """
+        local_path maps a url path to a file under root,
+        or returns None.
+        """
+        local = os.path.realpath(os.path.join(self.root, path.lstrip("/")))
+        if not local.startswith(self.root + os.sep):
+            return None
+        if not os.path.isfile(local):
+            return None
+        return local
+
+    def start(self):
+        """
+        start runs the server in a daemon thread.
+        """
+        handler = type("Handler", (OriginHandler,), {"origin": self})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        LOGGER.info(
+            "Origin serving %s on http://%s:%s/", self.root, self.host, self.port
+        )
+
+    def stop(self):
+        """
+        stop shuts the server down.
+        """
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,70 @@
+"""
+prefetch.py
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from .log import LOGGER
+
+
+class Prefetcher:
+    """
+    Prefetcher fetches segments into a SegmentCache
+    and indexes them in a RapIndexCache in a background thread,
+    so a segment is ready to split when its stanza is made.
+    """
+
+    def __init__(self, cache, index, workers=1, keep=16):
+        self.cache = cache
+        self.index = index
+        self.keep = keep
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _fetch(self, uri):
+        self.index.get(uri, self.cache.get(uri))
+
+    def submit(self, uri):
+        """
+        submit starts fetching and indexing uri.
+        """
+        with self.lock:
+            if uri in self.futures:
+                return
+            self.futures[uri] = self.pool.submit(self._fetch, uri)
+            while len(self.futures) > self.keep:
+                self.futures.popitem(last=False)
+
+    def wait(self, uri, timeout=None):
+        """
+        wait waits for uri to be fetched and indexed,
+        for at most timeout seconds.
+        Returns False if uri was not submitted,
+        failed or is not ready in time.
+        """
+        with self.lock:
+            future = self.futures.get(uri)
+        if future is None:
+            return False
+        try:
+            future.result(timeout)
+        except TimeoutError:
+            LOGGER.warning("prefetch %s not ready after %ss", uri, timeout)
+            return False
+        except Exception as err:
+            LOGGER.warning("prefetch %s failed: %s", uri, err)
+            return False
+        return True
+
+    def close(self):
+        """
+        close stops the background thread,
+        fetches not started yet are cancelled.
+        """
+        with self.lock:
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,176 @@
+"""
+probe.py
+"""
+
+import os
+from iframes import IFramer
+from .httppool import reader
+from .npscan import scan
+from .rapindex import RapIndex
+
+PKT_SIZE = 188
+
+
+class PtsProbe(IFramer):
+    """
+    PtsProbe finds the first PTS of a segment
+    by reading only the leading packets.
+    http(s) segments are probed with a Range request,
+    local segments with a bounded read.
+    If the leading packets have no PTS,
+    the whole segment is read.
+    With probe_bytes of 0, whole segments are always read.
+    Segments already in cache, a SegmentCache,
+    are probed without being fetched, and indexed
+    in index, a RapIndexCache, when there is one.
+    """
+
+    def __init__(self, probe_bytes=PKT_SIZE * 256, shush=True, cache=None, index=None):
+        super().__init__(shush=shush)
+        self.index = index
+        self.probe_bytes = 0
+        if probe_bytes:
+            self.probe_bytes = self._pkt_align(probe_bytes)
+        self.cache = cache
+        self.bytes_read = 0
+        self.bytes_saved = 0
+        self.probes = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _pkt_align(num_bytes):
+        """
+        _pkt_align rounds num_bytes up to whole packets.
+        """
+        pkts = -(-int(num_bytes) // PKT_SIZE)
+        return max(pkts, 1) * PKT_SIZE
+
+    @staticmethod
+    def _http_size(headers):
+        """
+        _http_size returns the full size of a segment
+        from Content-Range or Content-Length, or None.
+        """
+        content_range = headers.get("Content-Range")
+        if content_range:
+            total = content_range.rsplit("/", 1)[-1].strip()
+            if total.isdigit():
+                return int(total)
+            return None
+        content_length = headers.get("Content-Length")
+        if content_length and content_length.isdigit():
+            return int(content_length)
+        return None
+
+    def _head(self, media):
+        """
+        _head reads the leading probe_bytes of media
+        and returns them along with the full size of media,
+        and the bytes left unsent, 0 when an origin
+        ignores the Range request and sends it all.
+        """
+        if media.startswith("http"):
+            rng = {"Range": f"bytes=0-{self.probe_bytes - 1}"}
+            with reader(media, headers=rng) as leader:
+                total = self._http_size(leader.headers)
+                head = leader.read(self.probe_bytes)
+                ranged = "Content-Range" in leader.headers
+        else:
+            with reader(media) as leader:
+                total = os.fstat(leader.fileno()).st_size
+                head = leader.read(self.probe_bytes)
+                ranged = True
+        unsent = 0
+        if total and ranged:
+            unsent = max(total - len(head), 0)
+        return head, total, unsent
+
+    def first_in(self, buf):
+        """
+        first_in returns the PTS of the first iframe in buf.
+        """
+        if scan:
+            return RapIndex(buf).first()
+        for idx in range(0, len(buf) - PKT_SIZE + 1, PKT_SIZE):
+            if buf[idx + 1] & 0x40:
+                pts = self.parse(buf[idx : idx + PKT_SIZE])
+                if pts is not None:
+                    return pts
+        return None
+
+    def _first_cached(self, media, data):
+        """
+        _first_cached returns the PTS of the first iframe
+        in the cached bytes of media.
+        """
+        if self.index:
+            return self.index.get(media, data).first()
+        return self.first_in(data)
+
+    def first(self, media):
+        """
+        first returns the PTS of the first iframe,
+        reading media through the HttpPool.
+        """
+        with reader(media) as video:
+            for pkt in self.iter_pkts(video):
+                pts = self.parse(pkt)
+                if pts is not None:
+                    return pts
+        return None
+
+    def probe_chunks(self, chunks):
+        """
+        probe_chunks returns the PTS of the first iframe
+        in chunks, an iterable of whole packets,
+        reading no more chunks than it needs.
+        """
+        self.probes += 1
+        for chunk in chunks:
+            self.bytes_read += len(chunk)
+            pts = self.first_in(chunk)
+            if pts is not None:
+                return pts
+        return None
+
+    def _whole(self, media):
+        """
+        _whole probes the whole segment,
+        through the cache if there is one.
+        """
+        if self.cache and media.startswith("http"):
+            return self._first_cached(media, self.cache.get(media))
+        return self.first(media)
+
+    def probe(self, media):
+        """
+        probe returns the PTS of the first iframe in media.
+        """
+        self.probes += 1
+        if self.cache:
+            data = self.cache.peek(media)
+            if data is not None:
+                return self._first_cached(media, data)
+        if not self.probe_bytes:
+            return self._whole(media)
+        head, total, unsent = self._head(media)
+        self.bytes_read += len(head)
+        pts = self.first_in(head)
+        if pts is not None:
+            self.bytes_saved += unsent
+            return pts
+        if total is not None and total <= len(head):
+            return None
+        self.fallbacks += 1
+        return self._whole(media)
+
+    def stats(self):
+        """
+        stats returns the probe counters as a dict.
+        """
+        return {
+            "probes": self.probes,
+            "fallbacks": self.fallbacks,
+            "bytes_read": self.bytes_read,
+            "bytes_saved": self.bytes_saved,
+        }
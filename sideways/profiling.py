@@ -0,0 +1,374 @@
+"""
+profiling.py
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from .log import LOGGER
+
+ON = "\033[1m"
+OFF = "\033[0m"
+
+MODES = ("cprofile", "sample")
+SUFFIXES = {"cprofile": ".prof", "sample": ".folded"}
+PROFILE_NAME = "sideways"
+
+STAGES = {
+    "playlist fetch": (("sideways.py", "_http_m3u8"), ("sideways.py", "_file_m3u8")),
+    "tag parsing": (("m3ufu.py", "parse_tags"), ("hlstags.py", "parse_tags")),
+    "probing": (("sideways.py", "_probe"),),
+    "splitting": (("sideways.py", "_split"),),
+    "cue loading": (("sideways.py", "load_sidecar"),),
+    "manifest rendering": (("sideways.py", "write_m3u8"),),
+}
+
+
+class Sampler:
+    """
+    Sampler is a low overhead statistical profiler.
+    A daemon thread records the stack of every other thread
+    each interval seconds as a folded stack,
+    the format flamegraph tools read.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def fold(frame):
+        """
+        fold returns the stack of frame
+        as "file:function;file:function",
+        outermost first.
+        """
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            stacks = [
+                self.fold(frame)
+                for ident, frame in sys._current_frames().items()
+                if ident != me
+            ]
+            with self.lock:
+                self.stacks.update(stacks)
+
+    def enable(self):
+        """
+        enable starts sampling.
+        """
+        if self.thread:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        """
+        disable stops sampling.
+        """
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+    def dump_stats(self, path):
+        """
+        dump_stats writes the folded stacks to path.
+        """
+        with self.lock:
+            lines = [f"{stack} {count}\n" for stack, count in self.stacks.items()]
+        with open(path, "w", encoding="utf-8") as folded:
+            folded.writelines(lines)
+
+
+class _Snapshot:
+    """
+    _Snapshot holds the stats of a cProfile.Profile
+    in the form pstats.Stats loads.
+    """
+
+    def __init__(self, prof):
+        prof.snapshot_stats()
+        self.stats = prof.stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiler:
+    """
+    Profiler profiles the process it runs in
+    with cProfile or a Sampler, depending on mode,
+    and writes the profile to path.
+    cProfile counts CPU time, so waits between reloads
+    do not drown out the work, the Sampler counts wall time.
+    With per_thread, cProfile counts the CPU time of each thread,
+    and profile_thread profiles the thread it is called in,
+    the profiles of every thread are written as one.
+    The Sampler always samples every thread.
+    The profile is written when it stops, on SIGTERM,
+    and on SIGUSR1, which does not stop it.
+    """
+
+    def __init__(self, mode, path, interval=0.005, per_thread=False):
+        if mode not in MODES:
+            raise ValueError(f"profile mode must be in {MODES}")
+        self.mode = mode
+        self.path = path
+        self.running = False
+        self.timer = time.thread_time if per_thread else time.process_time
+        self.threads = []
+        self.lock = threading.Lock()
+        self.prof = (
+            Sampler(interval) if mode == "sample" else cProfile.Profile(self.timer)
+        )
+
+    def profile_thread(self):
+        """
+        profile_thread profiles the thread it is called in,
+        like a ThreadPoolExecutor worker from its initializer.
+        """
+        if self.mode != "cprofile":
+            return
+        prof = cProfile.Profile(self.timer)
+        with self.lock:
+            self.threads.append(prof)
+        prof.enable()
+
+    def _on_dump(self, signum, frame):
+        self.dump()
+
+    @staticmethod
+    def _on_term(signum, frame):
+        raise SystemExit(128 + signum)
+
+    def _handle_signals(self):
+        """
+        _handle_signals installs the signal handlers,
+        signals can only be handled in the main thread.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(signal.SIGTERM, self._on_term)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self._on_dump)
+
+    def start(self):
+        """
+        start starts profiling.
+        """
+        self._handle_signals()
+        self.running = True
+        self.prof.enable()
+
+    def dump(self):
+        """
+        dump writes the profile so far to path.
+        """
+        self.prof.disable()
+        tmp = f"{self.path}.tmp"
+        with self.lock:
+            threads = list(self.threads)
+        if threads:
+            stats = pstats.Stats(_Snapshot(self.prof))
+            for prof in threads:
+                stats.add(_Snapshot(prof))
+            stats.dump_stats(tmp)
+        else:
+            self.prof.dump_stats(tmp)
+        os.replace(tmp, self.path)
+        if self.running:
+            self.prof.enable()
+
+    def stop(self):
+        """
+        stop stops profiling and writes the profile.
+        """
+        self.running = False
+        self.dump()
+        LOGGER.info("Profile written to %s", self.path)
+
+
+def profile_path(mode, output_dir):
+    """
+    profile_path returns the profile file for a rendition,
+    in its output_dir.
+    """
+    return os.path.join(output_dir, PROFILE_NAME + SUFFIXES[mode])
+
+
+@contextmanager
+def profiled(mode, output_dir, per_thread=False):
+    """
+    profiled profiles a with block when mode is set,
+    writing the profile to output_dir.
+    """
+    if not mode:
+        yield None
+        return
+    profiler = Profiler(mode, profile_path(mode, output_dir), per_thread=per_thread)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def find_profiles(paths):
+    """
+    find_profiles returns the profile files in paths,
+    searching directories for the files
+    Profiler writes.
+    """
+    names = {PROFILE_NAME + suffix for suffix in SUFFIXES.values()}
+    found = []
+    for path in paths:
+        if not os.path.isdir(path):
+            found.append(path)
+            continue
+        for root, _, files in sorted(os.walk(path)):
+            found += [os.path.join(root, name) for name in files if name in names]
+    return found
+
+
+def read_folded(paths):
+    """
+    read_folded returns the folded stacks
+    in paths, summed.
+    """
+    stacks = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as folded:
+            for line in folded:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def _stage_of(filename, funcname):
+    spot = (os.path.basename(filename), funcname)
+    for stage, spots in STAGES.items():
+        if spot in spots:
+            return stage
+    return None
+
+
+def stage_times(stats):
+    """
+    stage_times returns the cumulative seconds
+    spent in each stage, from pstats.Stats.
+    """
+    times = dict.fromkeys(STAGES, 0.0)
+    for (filename, _, funcname), (_, _, _, cumtime, _) in stats.stats.items():
+        stage = _stage_of(filename, funcname)
+        if stage:
+            times[stage] += cumtime
+    return times
+
+
+def stage_samples(stacks):
+    """
+    stage_samples returns how many samples
+    were in each stage, from folded stacks.
+    """
+    counts = dict.fromkeys(STAGES, 0)
+    for stack, count in stacks.items():
+        seen = set()
+        for frame in stack.split(";"):
+            filename, _, funcname = frame.rpartition(":")
+            stage = _stage_of(filename, funcname)
+            if stage and stage not in seen:
+                seen.add(stage)
+                counts[stage] += count
+    return counts
+
+
+def _show_stages(values, total, unit):
+    for stage, value in values.items():
+        share = value / total * 100 if total else 0
+        shown = f"{value:.3f}" if isinstance(value, float) else str(value)
+        print(f"{stage:>20}  {shown:>12} {unit:<7}  {share:6.2f}%")
+
+
+def merge(paths, out=None, top=20):
+    """
+    merge merges the profile files in paths,
+    directories are searched for them.
+    cProfile and sampled profiles are merged separately,
+    to out with .prof or .folded appended when out is set.
+    A breakdown by stage is printed for each.
+    """
+    found = find_profiles(paths)
+    prof = [path for path in found if path.endswith(SUFFIXES["cprofile"])]
+    folded = [path for path in found if path.endswith(SUFFIXES["sample"])]
+    if not prof and not folded:
+        print(f"{ON}No profiles found in {paths}{OFF}")
+        return None
+    if prof:
+        stats = pstats.Stats(*prof, stream=sys.stdout)
+        print(f"{ON}{len(prof)} cProfile profiles, {stats.total_tt:.3f} s{OFF}")
+        _show_stages(stage_times(stats), stats.total_tt, "s")
+        stats.sort_stats("cumulative").print_stats(top)
+        if out:
+            stats.dump_stats(out + SUFFIXES["cprofile"])
+    if folded:
+        stacks = read_folded(folded)
+        total = sum(stacks.values())
+        print(f"{ON}{len(folded)} sampled profiles, {total} samples{OFF}")
+        _show_stages(stage_samples(stacks), total, "samples")
+        if out:
+            with open(out + SUFFIXES["sample"], "w", encoding="utf-8") as merged:
+                merged.writelines(
+                    f"{stack} {count}\n" for stack, count in stacks.most_common()
+                )
+    return found
+
+
+def cli():
+    """
+    cli merges rendition profiles from the command line.
+
+        sideways-profile -o merged output_dir
+
+    """
+    parser = argparse.ArgumentParser(description="merge sideways rendition profiles")
+    parser.add_argument(
+        "paths",
+        nargs="+",
+        help="profile files, or directories to search for them",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        default=None,
+        help=f"write merged profiles to OUT.prof and OUT.folded default: {ON}None{OFF}",
+    )
+    parser.add_argument(
+        "-n",
+        "--top",
+        type=int,
+        default=20,
+        help=f"functions to show, by cumulative time default: {ON}20{OFF}",
+    )
+    args = parser.parse_args()
+    merge(args.paths, args.out, args.top)
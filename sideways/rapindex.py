@@ -0,0 +1,137 @@
+"""
+rapindex.py
+"""
+
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from iframes import IFramer
+from .npscan import scan
+
+PKT_SIZE = 188
+WRAP = round((1 << 33) / 90000, 6)
+
+
+class RapIndex(IFramer):
+    """
+    RapIndex is the PTS and byte offset of every
+    random access point in a segment, built in one pass.
+    engine is "numpy" or "python", numpy is used
+    by default when it is installed.
+    """
+
+    def __init__(self, buf=b"", engine=None):
+        super().__init__(shush=True)
+        self.pts = []
+        self.offsets = []
+        self.size = len(buf)
+        self.ordered = True
+        if engine is None:
+            engine = "numpy" if scan else "python"
+        if engine == "numpy":
+            self.pts, self.offsets = scan(buf)
+            self.ordered = all(a <= b for a, b in zip(self.pts, self.pts[1:]))
+        else:
+            self._build(buf)
+
+    def _build(self, buf):
+        for idx in range(0, self.size - PKT_SIZE + 1, PKT_SIZE):
+            if buf[idx + 1] & 0x40:
+                pts = self.parse(buf[idx : idx + PKT_SIZE])
+                if pts:
+                    if self.pts and pts < self.pts[-1]:
+                        self.ordered = False
+                    self.pts.append(pts)
+                    self.offsets.append(idx)
+
+    def __len__(self):
+        return len(self.pts)
+
+    def first(self):
+        """
+        first returns the PTS of the first random access point, or None.
+        """
+        if self.pts:
+            return self.pts[0]
+        return None
+
+    def find(self, pts):
+        """
+        find returns the PTS and byte offset of the first
+        random access point with a PTS at or after pts,
+        or (None, size).
+        PTS that wrap inside the segment are searched in order,
+        a pts after the wrap is found after the wrap.
+        """
+        if self.ordered:
+            idx = bisect_left(self.pts, pts)
+            if idx < len(self.pts):
+                return self.pts[idx], self.offsets[idx]
+            return None, self.size
+        pts = self._unwrap(pts)
+        for rap_pts, offset in zip(self.pts, self.offsets):
+            if self._unwrap(rap_pts) >= pts:
+                return rap_pts, offset
+        return None, self.size
+
+    def _unwrap(self, pts):
+        """
+        _unwrap moves a PTS from after the wrap
+        past the PTS of the first random access point.
+        """
+        if pts < self.pts[0] - WRAP / 2:
+            return pts + WRAP
+        return pts
+
+
+class RapIndexCache:
+    """
+    RapIndexCache is an LRU cache of RapIndex keyed by URI,
+    so the probe and the splitter index a segment once.
+    """
+
+    def __init__(self, keep=64):
+        self.keep = keep
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def peek(self, uri):
+        """
+        peek returns the RapIndex for uri, or None.
+        """
+        with self.lock:
+            rap = self.items.get(uri)
+            if rap is not None:
+                self.items.move_to_end(uri)
+                self.hits += 1
+            return rap
+
+    def get(self, uri, buf):
+        """
+        get returns the RapIndex for uri,
+        building it from buf on a miss.
+        """
+        rap = self.peek(uri)
+        if rap is not None and rap.size == len(buf):
+            return rap
+        rap = RapIndex(buf)
+        with self.lock:
+            self.builds += 1
+            self.items[uri] = rap
+            self.items.move_to_end(uri)
+            while len(self.items) > self.keep:
+                self.items.popitem(last=False)
+        return rap
+
+    def stats(self):
+        """
+        stats returns the index counters as a dict.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "builds": self.builds,
+                "items": len(self.items),
+            }
@@ -0,0 +1,96 @@
+"""
+segcache.py
+"""
+
+import threading
+from collections import OrderedDict
+from .httppool import reader
+
+
+class SegmentCache:
+    """
+    SegmentCache is a size limited LRU cache
+    of segment bytes keyed by URI, so a segment
+    is fetched once for probing, decryption and splitting.
+    Segments are dropped once they are published.
+    """
+
+    def __init__(self, max_bytes=16 << 20):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, uri):
+        with self.lock:
+            return uri in self.items
+
+    def peek(self, uri):
+        """
+        peek returns the cached bytes for uri,
+        or None, without fetching.
+        """
+        with self.lock:
+            data = self.items.get(uri)
+            if data is not None:
+                self.items.move_to_end(uri)
+                self.hits += 1
+            return data
+
+    def put(self, uri, data):
+        """
+        put caches data for uri, evicting
+        the least recently used segments to make room.
+        Segments bigger than max_bytes are not cached.
+        """
+        with self.lock:
+            if uri in self.items:
+                self.size -= len(self.items.pop(uri))
+            if len(data) > self.max_bytes:
+                return
+            while self.items and self.size + len(data) > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+            self.items[uri] = data
+            self.size += len(data)
+
+    def drop(self, uri):
+        """
+        drop removes the bytes for uri, if cached.
+        """
+        with self.lock:
+            data = self.items.pop(uri, None)
+            if data is not None:
+                self.size -= len(data)
+
+    def get(self, uri):
+        """
+        get returns the bytes for uri,
+        fetching and caching them on a miss.
+        """
+        data = self.peek(uri)
+        if data is not None:
+            return data
+        with self.lock:
+            self.misses += 1
+        with reader(uri) as media:
+            data = media.read()
+        self.put(uri, data)
+        return data
+
+    def stats(self):
+        """
+        stats returns the cache counters as a dict.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "items": len(self.items),
+                "bytes": self.size,
+            }
@@ -0,0 +1,113 @@
+"""
+sharecache.py
+"""
+
+import os
+import threading
+import time
+
+NONE = "none"
+_LOCK = threading.Lock()
+
+
+class ShareCache:
+    """
+    ShareCache shares PTS probes and splice points
+    between rendition processes.
+    shared is a multiprocessing Manager dict,
+    or a plain dict when renditions share one process.
+    keys are tuples like ("pts", media_sequence).
+    Puts and prunes hold a lock shared by every ShareCache
+    in the process, renditions in the aio engine
+    share one dict between threads.
+    """
+
+    def __init__(self, shared, wait=2.0, keep=500):
+        self.shared = shared
+        self.wait = wait
+        self.keep = keep
+        self.token = f"pending-{os.getpid()}-{id(self)}"
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+
+    @staticmethod
+    def _is_pending(val):
+        return isinstance(val, str) and val.startswith("pending-")
+
+    def _wait_for(self, key):
+        """
+        _wait_for waits for another rendition
+        to finish a pending key.
+        """
+        stop = time.monotonic() + self.wait
+        while time.monotonic() < stop:
+            val = self.shared.get(key)
+            if not self._is_pending(val):
+                return val
+            time.sleep(0.01)
+        return None
+
+    def get(self, key):
+        """
+        get returns the value for key,
+        NONE for a stored None,
+        or None if key is missing or pending.
+        """
+        val = self.shared.get(key)
+        if val is None or self._is_pending(val):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return val
+
+    def put(self, key, val):
+        """
+        put stores val for key.
+        """
+        if val is None:
+            val = NONE
+        with _LOCK:
+            self.shared[key] = val
+            self.puts += 1
+        if self.puts % 100 == 0:
+            self.prune(key[1])
+
+    def fetch(self, key, func):
+        """
+        fetch returns the value for key,
+        calling func to make it if no other
+        rendition has, or is making it.
+        """
+        val = self.shared.setdefault(key, self.token)
+        if val != self.token:
+            if self._is_pending(val):
+                val = self._wait_for(key)
+            if val is not None:
+                self.hits += 1
+                if val == NONE:
+                    return None
+                return val
+        self.misses += 1
+        val = func()
+        if val is None:
+            self.shared.pop(key, None)
+        else:
+            self.put(key, val)
+        return val
+
+    def prune(self, media_sequence):
+        """
+        prune drops keys more than keep
+        media sequence numbers behind media_sequence.
+        """
+        with _LOCK:
+            for key in list(self.shared.keys()):
+                if key[1] < media_sequence - self.keep:
+                    self.shared.pop(key, None)
+
+    def stats(self):
+        """
+        stats returns the cache counters as a dict.
+        """
+        return {"hits": self.hits, "misses": self.misses, "puts": self.puts}
@@ -0,0 +1,170 @@
+"""
+sidewatch.py
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT = struct.Struct("iIII")
+TAIL_SIZE = 64
+
+
+def _inotify():
+    """
+    _inotify returns libc when it has inotify, or None.
+    """
+    name = ctypes.util.find_library("c")
+    if not name:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class SideWatch:
+    """
+    SideWatch watches a sidecar file and returns
+    only the lines appended since the last read.
+    Changes are seen with inotify on Linux,
+    and with os.stat everywhere else.
+    If the file is rewritten, and what was already read
+    is no longer at the start of it, it is read from the top.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.offset = 0
+        self.tail = b""
+        self.partial = b""
+        self.stat = None
+        self.fd = None
+        self._watch()
+
+    def _watch(self):
+        """
+        _watch sets up an inotify watch on the
+        directory of the sidecar, so rewrites by rename are seen.
+        """
+        libc = _inotify()
+        if not libc:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        folder = os.path.dirname(os.path.abspath(self.path)).encode()
+        if libc.inotify_add_watch(fd, folder, WATCH_MASK) < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+
+    def _events(self):
+        """
+        _events drains the inotify queue and
+        returns True if the sidecar was touched.
+        """
+        touched = False
+        while True:
+            try:
+                buf = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return touched
+            if not buf:
+                return touched
+            idx = 0
+            while idx + EVENT.size <= len(buf):
+                _, _, _, size = EVENT.unpack_from(buf, idx)
+                idx += EVENT.size
+                name = buf[idx : idx + size].split(b"\0", 1)[0]
+                idx += size
+                if name.decode(errors="ignore") == self.name:
+                    touched = True
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def changed(self):
+        """
+        changed returns True if the sidecar has changed
+        since the last call.
+        """
+        stat = self.stat
+        if self.fd is not None:
+            touched = self._events()
+            if stat is not None:
+                if not touched:
+                    return False
+                stat = None
+        self.stat = self._stat()
+        return self.stat != stat
+
+    def _rewound(self, sidefile, size):
+        """
+        _rewound checks if the bytes already read
+        are still where they were.
+        """
+        if size < self.offset:
+            return True
+        if not self.tail:
+            return False
+        sidefile.seek(self.offset - len(self.tail))
+        return sidefile.read(len(self.tail)) != self.tail
+
+    def _read(self):
+        with open(self.path, "rb") as sidefile:
+            size = os.fstat(sidefile.fileno()).st_size
+            if self._rewound(sidefile, size):
+                self.offset = 0
+                self.tail = b""
+                self.partial = b""
+            sidefile.seek(self.offset)
+            data = sidefile.read(size - self.offset)
+        self.offset += len(data)
+        self.tail = (self.tail + data)[-TAIL_SIZE:]
+        return data
+
+    def read(self):
+        """
+        read returns a list of new lines.
+        A last line with no newline is returned
+        once the file stops changing.
+        """
+        if not self.changed():
+            if not self.partial:
+                return []
+            lines = [self.partial]
+            self.partial = b""
+            return lines
+        try:
+            data = self._read()
+        except FileNotFoundError:
+            return []
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        return lines
+
+    def close(self):
+        """
+        close stops watching.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
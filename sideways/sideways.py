@@ -3,26 +3,42 @@ sideways.py
 """
 
 import argparse
-from collections import deque
 import datetime
 import os
+import queue
 import sys
+import threading
 import time
-from operator import itemgetter
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError
 import multiprocessing as mp
 
 from m3ufu import (
     M3uFu,
-    AESDecrypt,
     TagParser,
     HEADER_TAGS,
 )
 import threefive
-from threefive import Cue
-from new_reader import reader
-from iframes import IFramer
 from umzz import UMZZ
+from .aes import AesDecrypter, key_tag, mk_iv
+from .cuelisten import CueListener
+from .cueschedule import CueSchedule
+from .engine import AioEngine
+from .httppool import POOL, reader
+from .log import LEVELS, LOGGER, LogWriter, rendition_log, worker_logging
+from .metrics import Metrics, MetricsHub
+from .origin import Origin
+from .prefetch import Prefetcher
+from .profiling import MODES, profiled
+from .probe import PtsProbe
+from .rapindex import RapIndexCache
+from .segcache import SegmentCache
+from .sharecache import ShareCache, NONE
+from .sidewatch import SideWatch
 from .splitstream import SplitStream
+from .window import SeenMedia, SegmentWindow
+
+SENT_CUES = 1000
 
 """
 Odd number versions are releases.
@@ -107,20 +123,20 @@ class AacParser:
         """
         aac_pts parses the ID3 header tags in aac and ac3 audio files
         """
-        aac = reader(media)
-        header = aac.read(10)
-        if self.is_header(header):
-            id3len = self.id3_len(header)
-            data = aac.read(id3len)
-            pts = 0
-            if self.applehead in data:
-                try:
-                    pts = float(data.split(self.applehead)[1].split(b"\x00", 2)[1])
-                except:
-                    pts = self.syncsafe5(data.split(self.applehead)[1][:9])
-                finally:
-                    self.first_segment = False
-                    return round((pts % ROLLOVER), 6)
+        with reader(media) as aac:
+            header = aac.read(10)
+            if self.is_header(header):
+                id3len = self.id3_len(header)
+                data = aac.read(id3len)
+                pts = 0
+                if self.applehead in data:
+                    try:
+                        pts = float(data.split(self.applehead)[1].split(b"\x00", 2)[1])
+                    except:
+                        pts = self.syncsafe5(data.split(self.applehead)[1][:9])
+                    finally:
+                        self.first_segment = False
+                        return round((pts % ROLLOVER), 6)
 
 
 class Segment:
@@ -129,7 +145,18 @@ class Segment:
     and associated data
     """
 
-    def __init__(self, lines, media_uri, start, base_uri, first):
+    def __init__(
+        self,
+        lines,
+        media_uri,
+        start,
+        base_uri,
+        first,
+        prober=None,
+        cache=None,
+        key=None,
+        aes=None,
+    ):
         self.lines = lines
         self.media = media_uri
         self.pts = 0
@@ -139,12 +166,20 @@ class Segment:
         self.cue = False
         self.cue_data = None
         self.tags = {}
-        self.tmp = None
         self.base_uri = base_uri
         self.relative_uri = media_uri.replace(base_uri, "")
-        self.last_iv = None
-        self.last_key_uri = None
+        self.key = key
+        self.key_uri = None
+        self.iv = None
         self.first = first
+        self.prober = prober
+        self.cache = cache
+        self.aes = aes
+        self.probed = False
+        self.msn = None
+        self.seq = None
+        self.rendered = None
+        self.key_line = None
 
     def __repr__(self):
         return str(self.__dict__)
@@ -193,51 +228,102 @@ class Segment:
 
     def _get_pts_start(self):
         pts_start = None
-        if ".aac" in self.media:
+        if self.key_uri:
+            pts_start = self._probe_aes()
+        elif ".aac" in self.media:
             ap = AacParser()
             pts_start = ap.parse(self.media)
+        elif self.prober:
+            pts_start = self.prober.probe(self.media)
         else:
-            iframer = IFramer(shush=True)
+            iframer = PtsProbe(0)
             pts_start = iframer.first(self.media)
         if pts_start:
             self.pts = round(pts_start, 6)
         self.start = self.pts
 
-    def media_file(self):
+    def _chk_aes(self):
+        """
+        _chk_aes sets key_uri and iv for AES-128 segments.
+        An #EXT-X-KEY applies to every segment after it,
+        key is the one in effect before this segment.
         """
-        media_file returns self.media
-        or self.tmp if self.media is AES Encrypted
+        self.key = self.tags.get("#EXT-X-KEY", self.key)
+        self.key_uri = None
+        if not self.key or self.key.get("METHOD") != "AES-128":
+            return
+        if "URI" in self.key:
+            self.key_uri = self.abs_key_uri(self.key)
+            self.iv = mk_iv(self.key.get("IV"), self.msn)
+            if not self.aes:
+                self.aes = AesDecrypter(cache=self.cache)
+
+    def abs_key_uri(self, key):
         """
-        media_file = self.media
-        if self.tmp:
-            media_file = self.tmp
-        return media_file
+        abs_key_uri returns the URI of an #EXT-X-KEY,
+        made absolute with base_uri like the media URI.
+        """
+        key_uri = key.get("URI")
+        if key_uri and not key_uri.startswith("http"):
+            key_uri = self.base_uri + key_uri
+        return key_uri
 
-    def _chk_aes(self):
-        if "#EXT-X-KEY" in self.tags:
-            if "URI" in self.tags["#EXT-X-KEY"]:
-                key_uri = self.tags["#EXT-X-KEY"]["URI"]
-                if not key_uri.startswith("http"):
-                    key_uri = self.base_uri + key_uri
-                if "IV" in self.tags["#EXT-X-KEY"]:
-                    iv = self.tags["#EXT-X-KEY"]["IV"]
-                    decryptr = AESDecrypt(self.media, key_uri, iv)
-                    self.tmp = decryptr.decrypt()
-                    self.last_iv = iv
-                    self.last_key_uri = key_uri
-        else:
-            if self.last_iv is not None:
-                decryptr = AESDecrypt(self.media, self.last_key_uri, self.last_iv)
-                self.tmp = decryptr.decrypt()
+    def _probe_aes(self):
+        """
+        _probe_aes probes an AES-128 segment,
+        decrypting only the leading chunks.
+        """
+        prober = self.prober or PtsProbe(0)
+        chunks = self.aes.leading(self.media, self.key_uri, self.iv)
+        try:
+            return prober.probe_chunks(chunks)
+        finally:
+            chunks.close()
 
-    def decode(self):
-        self.tags = TagParser(self.lines).tags
-        self._chk_aes()
-        self._extinf()
-        self._get_pts_start()
+    def decrypt(self):
+        """
+        decrypt returns the decrypted segment in memory,
+        good until the next decrypt.
+        """
+        return self.aes.decrypt(self.media, self.key_uri, self.iv)
+
+    def _set_end(self):
         if self.start:
             self.start = round(self.start, 6)
             self.end = round(self.start + self.duration, 6)
+
+    def set_start(self, start):
+        """
+        set_start sets start and end
+        from a PTS probed elsewhere.
+        """
+        self.pts = start
+        self.start = start
+        self._set_end()
+        self.probed = True
+
+    def probe_pts(self):
+        """
+        probe_pts sets start and end
+        from the PTS of the segment.
+        """
+        self._get_pts_start()
+        self._set_end()
+        self.probed = True
+        return self.start
+
+    def decode(self, probe=True):
+        """
+        decode parses the segment tags.
+        When probe is False, start is left
+        as the start passed in, extrapolated from EXTINF.
+        """
+        self.tags = TagParser(self.lines).tags
+        self._chk_aes()
+        self._extinf()
+        if probe:
+            return self.probe_pts()
+        self._set_end()
         return self.start
 
     def get_lines(self):
@@ -248,6 +334,7 @@ class Segment:
         add_tag appends key and value for a hls tag
         """
         self.tags[quay] = val
+        self.rendered = None
 
     def as_stanza(self):
         """
@@ -270,6 +357,16 @@ class Segment:
         stanza.append(self.media)
         return stanza
 
+    def as_bytes(self):
+        """
+        as_bytes returns the stanza as encoded m3u8 lines.
+        The stanza is rendered once and cached
+        until add_tag changes a tag.
+        """
+        if self.rendered is None:
+            self.rendered = "".join(f"{x}\n" for x in self.as_stanza()).encode()
+        return self.rendered
+
 
 class SCTE35:
     """
@@ -462,7 +559,7 @@ class Sideways:
 
     def __init__(self, args):
         self.base_uri = ""
-        self.sidecar = deque()
+        self.sidecar = CueSchedule()
         self.sidecar_file = "sidecar.txt"
         self.discontinuity_sequence = 0
         self.reload = True
@@ -476,10 +573,44 @@ class Sideways:
         self.window_size = 100
         self.first = True
         self.scte35 = SCTE35()
-        self.last_sidelines = None
+        self.sidewatch = None
+        self.cue_queue = None
         self.args = args
-        self.segments = deque()
-        self.media_list = deque()
+        self.segments = SegmentWindow(self.window_size)
+        self.seen = SeenMedia(self.window_size)
+        self.last_uri = None
+        self.last_msn = None
+        self.etag = None
+        self.last_modified = None
+        self.m3u8_stat = None
+        self.new_segments = 0
+        self.last_duration = None
+        self.seq = None
+        self.rendered = b""
+        self.rendered_seq = None
+        self.origin = None
+        self.byterange = False
+        self.byteranges = (None, None)
+        self.cache = None
+        self.index = RapIndexCache()
+        self.prober = None
+        self.prefetch = None
+        self.lookahead = 0
+        self.timeline = False
+        self.drift_check = 10
+        self.since_probe = 0
+        self.msn = 0
+        self.share = None
+        self.aes = None
+        self.aes_key = None
+        self.key_cleared = False
+        self.metrics = Metrics()
+        self.metrics_queue = None
+        self.last_reload = None
+        self.source_changed = None
+        self.cue_arrivals = {}
+        self.cue_due = None
+        self.log = rendition_log()
 
     def _args_version(self):
         if self.args.version:
@@ -492,10 +623,34 @@ class Sideways:
 
     def _args_output(self):
         self.output = self.args.output_dir
+        self.log.extra["rendition"] = os.path.basename(os.path.normpath(self.output))
 
     def _args_sidecar(self):
         self.sidecar_file = self.args.sidecar
 
+    def _args_probe_bytes(self):
+        if self.args.cache_mb and self.cache is None:
+            self.cache = SegmentCache(self.args.cache_mb << 20)
+        if self.args.probe_bytes or self.cache:
+            self.prober = PtsProbe(
+                self.args.probe_bytes, cache=self.cache, index=self.index
+            )
+
+    def _args_lookahead(self):
+        self.lookahead = self.args.lookahead
+        if self.lookahead and self.cache:
+            self.prefetch = Prefetcher(self.cache, self.index)
+
+    def _args_aes(self):
+        self.aes = AesDecrypter(cache=self.cache)
+
+    def _args_timeline(self):
+        self.timeline = self.args.timeline
+        self.drift_check = self.args.drift_check
+
+    def _args_byterange(self):
+        self.byterange = self.args.byterange
+
     def _args_hls_tag(self):
         tag_map = {
             "x_scte35": self.scte35.x_scte35,
@@ -517,6 +672,11 @@ class Sideways:
         self._args_output()
         self._args_sidecar()
         self._args_hls_tag()
+        self._args_probe_bytes()
+        self._args_lookahead()
+        self._args_aes()
+        self._args_timeline()
+        self._args_byterange()
 
     @staticmethod
     def _clean_line(line):
@@ -538,7 +698,7 @@ class Sideways:
         return f"{head}{tail}"
 
     def _set_times(self, segment):
-        if not self.start:
+        if not self.start or (self.timeline and segment.probed):
             self.start = segment.start
         if not self.start:
             self.start = 0.0
@@ -547,84 +707,337 @@ class Sideways:
     def _add_segment_tags(self, segment):
         self._add_cue_tag(segment)
         segment.add_tag("# start", f" {segment.start} ")
-        if segment.tmp:
-            os.unlink(segment.tmp)
-            del segment.tmp
-
-    def _pop(self, media):
-        popped = None
-        if media not in self.media_list:
-            self.media_list.append(media)
-            while len(self.media_list) == self.window_size:
-                popped = self.media_list.popleft()
-                del popped
-            while len(self.segments) == self.window_size:
-                popped = self.segments.popleft()
-                del popped
-
-    def _add_split_segment(self, chunk, media, start):
+
+    def memory(self):
+        """
+        memory returns the approximate bytes
+        held by the rendition, as a dict.
+        """
+        return {
+            "segments": len(self.segments),
+            "evicted": self.segments.evicted,
+            "window_bytes": self.segments.nbytes(),
+            "seen_bytes": self.seen.nbytes(),
+            "cache_bytes": self.cache.size if self.cache else 0,
+            "rap_indexes": len(self.index.items),
+            "cues": len(self.sidecar),
+            "aes_bytes": len(self.aes.buf) if self.aes else 0,
+        }
+
+    def _add_split_segment(self, chunk, media, start, byterange=None, plain=False):
+        """
+        _add_split_segment adds an a- or b- segment.
+        plain split segments of an AES-128 segment
+        get #EXT-X-KEY:METHOD=NONE.
+        """
+        if byterange:
+            chunk.append(f"#EXT-X-BYTERANGE:{byterange}")
         sp_seg = Segment(chunk, media, start, self.args.output_dir, self.first)
-        sp_seg.decode()
-        sp_seg.media = sp_seg.media.rsplit("/", 1)[-1]
+        if byterange:
+            sp_seg.decode(probe=False)
+            sp_seg.set_start(start)
+        else:
+            sp_seg.decode()
+            sp_seg.media = sp_seg.media.rsplit("/", 1)[-1]
+        if plain:
+            sp_seg.add_tag("#EXT-X-KEY", "METHOD=NONE")
+            self.key_cleared = True
         self._add_segment_tags(sp_seg)
         self._add_segment(sp_seg)
-        self.media_list.append(sp_seg.media)
         self.chunk = []
 
     def _add_media(self, media):
         segment = Segment(
-            self.chunk, media, self.start, self.base_uri, first=self.first
+            self.chunk,
+            media,
+            self.start,
+            self.base_uri,
+            first=self.first,
+            prober=self.prober,
+            cache=self.cache,
+            key=self.aes_key,
+            aes=self.aes,
         )
-        segment.decode()
+        self.new_segments += 1
+        segment.msn = self.msn
+        segment.decode(probe=False)
+        self.aes_key = segment.key
+        self.last_duration = segment.duration
+        self.load_sidecar()
+        self._chk_cache(segment)
+        if self._needs_probe(segment):
+            self._probe(segment)
+            self.since_probe = 0
+        else:
+            self.since_probe += 1
         self._chk_sidecar_cues(segment)
         if self.scte35.cue_time:
             if (segment.start) < self.scte35.cue_time < (segment.end):
-                print(segment.start, "CUE", self.scte35.cue_time)
+                self.log.info("%s CUE %s", segment.start, self.scte35.cue_time)
                 self.chunk = []
-                stream = SplitStream()
-                splice_point, a_media, b_media = stream.split_at(
-                    segment.media, self.scte35.cue_time, self.args.output_dir
+                with self.metrics.timer("split_seconds"):
+                    splice_point, a_media, b_media = self._split(segment)
+                self.metrics.inc(
+                    "split_bytes_total", self._split_size(a_media, b_media)
                 )
-                print("Splice Point @", splice_point, "Splitting Segment")
+                self.log.info("Splice Point @ %s Splitting Segment", splice_point)
+                if self.cache:
+                    self.log.debug("segment cache %s", self.cache.stats())
+                self.log.debug("rap index %s", self.index.stats())
+                self.log.debug("http pool %s", POOL.stats())
+                self.log.debug("memory %s", self.memory())
+                if segment.key_uri:
+                    self.log.debug("aes keys %s", self.aes.keys.stats())
                 if splice_point:
                     a_chunk = [
                         f"#EXTINF:{round(self.scte35.cue_time - segment.start,6)}"
                     ]
                     a_start = segment.start
-                    self._add_split_segment(a_chunk, a_media, a_start)
+                    a_range, b_range = self.byteranges
+                    plain = segment.key_uri is not None
+                    self._add_split_segment(a_chunk, a_media, a_start, a_range, plain)
                     # self.write_m3u8()
-                    print(self.scte35.cue_time, "spliced @", splice_point)
+                    self.log.info("%s spliced @ %s", self.scte35.cue_time, splice_point)
                     b_chunk = [f"#EXTINF:{round(segment.end - self.scte35.cue_time,6)}"]
                     self.scte35.mk_cue_state()
                     b_start = self.scte35.cue_time
-                    self._add_split_segment(b_chunk, b_media, b_start)
+                    if b_range:
+                        b_start = splice_point
+                    self._add_split_segment(b_chunk, b_media, b_start, b_range, plain)
                     self.scte35.cue_time = None
+                    self.seen.add(segment.media)
+                    self._uncache(segment)
                     return
         self.scte35.mk_cue_state()
+        self._chk_key(segment)
         self._add_segment_tags(segment)
         self._add_segment(segment)
+        self.seen.add(segment.media)
+        self._uncache(segment)
+
+    def _uncache(self, segment):
+        """
+        _uncache drops a published segment
+        from the segment cache, its bytes are not read again.
+        """
+        if self.cache:
+            self.cache.drop(segment.media)
+
+    def _chk_key(self, segment):
+        """
+        _chk_key writes the #EXT-X-KEY of a segment,
+        with its URI made absolute like media URIs.
+        The key in effect is put back on the first
+        AES-128 segment after plain split segments,
+        with an explicit IV once splits have shifted
+        media sequence numbers, which players use
+        as the IV when there is none.
+        The key in effect is kept as key_line,
+        for when the segment is first in the window.
+        """
+        if not segment.key:
+            return
+        uri = segment.abs_key_uri(segment.key)
+        tag = key_tag(segment.key, uri=uri)
+        segment.key_line = f"#EXT-X-KEY:{tag}\n".encode()
+        if not segment.key_uri:
+            if "#EXT-X-KEY" in segment.tags:
+                segment.add_tag("#EXT-X-KEY", tag)
+            return
+        shifted = self.seq is not None and self.seq != segment.msn
+        needs_iv = shifted and "IV" not in segment.key
+        if self.key_cleared or needs_iv or "#EXT-X-KEY" in segment.tags:
+            iv = segment.iv if needs_iv else None
+            segment.add_tag("#EXT-X-KEY", key_tag(segment.key, iv, uri))
+            self.key_cleared = False
+
+    def _chk_cache(self, segment):
+        """
+        _chk_cache fetches an http(s) segment into the cache
+        when a cue may land in it, so probing and splitting
+        read the segment once.
+        Prefetched segments are already cached,
+        a prefetch not ready within the target duration
+        is fetched here instead.
+        """
+        if self.prefetch and self.prefetch.wait(segment.media, self.target_duration()):
+            return
+        if self.cache and segment.media.startswith("http"):
+            if self._cue_pending(segment):
+                self.cache.get(segment.media)
+
+    def _probe(self, segment):
+        """
+        _probe probes the segment PTS, or uses the PTS
+        another rendition probed for the same media sequence.
+        """
+        probed = self.prober.bytes_read if self.prober else 0
+        with self.metrics.timer("probe_seconds"):
+            if self.share:
+                key = ("pts", segment.msn)
+                segment.set_start(self.share.fetch(key, segment.probe_pts))
+            else:
+                segment.probe_pts()
+        if self.prober:
+            self.metrics.inc("probe_bytes_total", self.prober.bytes_read - probed)
+
+    def _split(self, segment):
+        """
+        _split splits the segment at the first iframe
+        at or after cue_time. With a shared cache,
+        the splice point found by another rendition is used.
+        """
+        self.byteranges = (None, None)
+        cue_time = self.scte35.cue_time
+        if not self.share:
+            return self._split_at(segment, cue_time)
+        key = ("splice", segment.msn, cue_time)
+        known = self.share.get(key)
+        if known == NONE:
+            return None, None, None
+        if known:
+            return self._split_at(segment, known)
+        splice_point, a_media, b_media = self._split_at(segment, cue_time)
+        self.share.put(key, splice_point)
+        return splice_point, a_media, b_media
+
+    def _split_at(self, segment, pts):
+        """
+        _split_at writes a- and b- segments,
+        or in byterange mode, sets self.byteranges
+        for both halves of the original segment.
+        AES encrypted segments are decrypted in memory
+        and always written.
+        """
+        stream = SplitStream(cache=self.cache, index=self.index)
+        self.byteranges = (None, None)
+        if segment.key_uri:
+            data = segment.decrypt()
+            return stream.split_data(segment.media, data, pts, self.args.output_dir)
+        if self.byterange:
+            splice_point, offset, size = stream.splice_range(segment.media, pts)
+            self.byteranges = (f"{offset}@0", f"{size - offset}@{offset}")
+            return splice_point, segment.media, segment.media
+        return stream.split_at(segment.media, pts, self.args.output_dir)
+
+    def _split_size(self, a_media, b_media):
+        """
+        _split_size returns the bytes of a split segment.
+        """
+        a_range, b_range = self.byteranges
+        if b_range:
+            size, offset = b_range.split("@")
+            return int(size) + int(offset)
+        return sum(
+            os.path.getsize(media)
+            for media in (a_media, b_media)
+            if media and os.path.isfile(media)
+        )
+
+    def _cue_pending(self, segment):
+        """
+        _cue_pending checks for a sidecar cue or cue_time
+        that may land in the segment, allowing a segment
+        duration of slack for drift.
+        """
+        if not segment.start:
+            return False
+        slack = segment.duration
+        lo = segment.start - slack
+        hi = segment.end + slack
+        if self.scte35.cue_time and lo <= self.scte35.cue_time <= hi:
+            return True
+        return bool(self.sidecar.between(lo, hi))
+
+    def _cue_ahead(self):
+        """
+        _cue_ahead checks for a sidecar cue or cue_time
+        within the next lookahead target durations.
+        """
+        if not self.start:
+            return False
+        lo = self.start - self.target_duration()
+        hi = self.start + self.lookahead * self.target_duration()
+        if self.scte35.cue_time and lo <= self.scte35.cue_time <= hi:
+            return True
+        return bool(self.sidecar.between(lo, hi))
+
+    def _lookahead(self, lines):
+        """
+        _lookahead hands new http(s) segments to the prefetcher
+        when a cue is coming up, so they are fetched and
+        keyframe indexed before their stanzas are made.
+        """
+        if not self.prefetch:
+            return
+        self.load_sidecar()
+        if not self._cue_ahead():
+            return
+        for line in lines:
+            line = self._clean_line(line)
+            if not line or line.startswith("#"):
+                continue
+            media = self._mk_media(line)
+            if media.startswith("http") and media not in self.seen:
+                self.prefetch.submit(media)
+
+    def _needs_probe(self, segment):
+        """
+        _needs_probe decides if the start of a segment
+        is probed or extrapolated from EXTINF.
+        In timeline mode, segments are probed
+        first, after a discontinuity, every drift_check segments,
+        and when a cue may land in the segment.
+        """
+        if not self.timeline or not segment.start:
+            return True
+        if "#EXT-X-DISCONTINUITY" in segment.tags:
+            return True
+        if self.drift_check and self.since_probe >= self.drift_check:
+            return True
+        return self._cue_pending(segment)
 
     def _add_segment(self, segment):
+        if self.seq is None:
+            self.seq = segment.msn or 0
+        segment.seq = self.seq
+        self.seq += 1
         self.segments.append(segment)
+        self.metrics.inc("segments_total")
         self._set_times(segment)
         self.first = False
-        p = f" {ON}{self.pnum()}{OFF} "
-        m = f"media: {segment.relative_uri.rsplit('/')[-1]}\t"
-        s = f"start: {segment.start}\t"
-        d = f"duration: {segment.duration}"
-        print(f"{p}{m}{s}{d}")
+        fields = {
+            "media": segment.relative_uri.rsplit("/")[-1],
+            "start": segment.start,
+            "duration": segment.duration,
+        }
+        if self.prober:
+            fields["probe_saved"] = self.prober.bytes_saved
+        self.log.info(
+            "\t".join(f"{key}: %s" for key in fields),
+            *fields.values(),
+            extra=fields,
+        )
         if self.scte35.break_timer is not None:
             self.scte35.break_timer += segment.duration
-        self._pop(segment.media)
+        if self.segments.evicted and not self.segments.evicted % len(self.segments):
+            self.log.debug("memory %s", self.memory())
 
-    def _do_media(self, line):
+    def _mk_media(self, line):
         media = line
         if self.base_uri not in line:
             if "http" not in line:
                 media = self.base_uri + media
-        if media not in self.media_list:
+        return media
+
+    def _do_media(self, line):
+        media = self._mk_media(line)
+        if media not in self.seen:
             self._add_media(media)
         self.chunk = []
+        self.last_uri = line
+        self.last_msn = self.msn
+        self.msn += 1
 
     def _parse_header(self, line):
         splitline = line.split(":", 1)
@@ -638,6 +1051,8 @@ class Sideways:
                 except:
                     val = None
             self.headers[tag] = val
+            if tag == "#EXT-X-MEDIA-SEQUENCE" and isinstance(val, int):
+                self.msn = val
             return True
         return False
 
@@ -665,115 +1080,342 @@ class Sideways:
         exf = b"#EXTINF:"
         ws = [line for line in m3u8_lines if exf in line]
         self.window_size = len(ws)
+        # the window has always held one less than the playlist,
+        # seen covers every source segment in the playlist.
+        self.segments.resize(self.window_size - 1)
+        self.seen.resize(self.window_size)
 
-    def decode(self):
+    def setup(self):
+        """
+        setup applies args and sets base_uri.
+        """
         self._apply_args()
         if self.m3u8:
             based = self.m3u8.rsplit("/", 1)
             if len(based) > 1:
                 self.base_uri = f"{based[0]}/"
-        while self.reload:
-            self.read_m3u8()
+
+    def step(self):
+        """
+        step does one reload, writes the m3u8
+        if there are new segments, and returns
+        how long to wait before the next step.
+        """
+        started = time.monotonic()
+        if self.read_m3u8():
             self.write_m3u8()
+        if self.metrics_queue is not None:
+            self.metrics_queue.put(self.metrics.snapshot())
+        return self.reload_delay(started)
 
-    def read_m3u8(self):
-        with reader(self.m3u8) as self.manifest:
-            m3u8_lines = self.manifest.readlines()
-            if self.first:
-                self._get_window_size(m3u8_lines)
-            for line in m3u8_lines:
-                if not self._parse_line(line):
-                    break
+    def decode(self):
+        self.setup()
+        try:
+            while self.reload:
+                time.sleep(self.step())
+        finally:
+            self.close()
 
-    def write_m3u8(self):
-        out = self.mk_uri(self.output, self.outfile)
-        with open(out, "w", encoding="utf8") as npm3u8:
-            for k, v in self.headers.items():
-                if v is None:
-                    npm3u8.write(f"{k}\n")
-                else:
-                    npm3u8.write(f"{k}:{v}\n")
-            for segment in self.segments:
-                stanza = segment.as_stanza()
-                _ = [npm3u8.write(j + "\n") for j in stanza]
-        throttle = self.segments[-1].duration * 0.97
-        time.sleep(throttle)
+    def close(self):
+        """
+        close stops the prefetcher threads
+        when the rendition stops.
+        """
+        if self.prefetch:
+            self.prefetch.close()
+
+    def target_duration(self):
+        """
+        target_duration returns #EXT-X-TARGETDURATION,
+        or the last segment duration if it is not set.
+        """
+        target = self.headers.get("#EXT-X-TARGETDURATION")
+        if not isinstance(target, (int, float)) or not target:
+            target = self.last_duration or 1.0
+        return target
+
+    def last_seq(self):
+        """
+        last_seq returns the media sequence number
+        of the last segment in the rendered m3u8.
+        """
+        return self.rendered_seq
+
+    def has_seq(self, msn):
+        """
+        has_seq checks if the rendered m3u8
+        has media sequence number msn.
+        """
+        return self.rendered_seq is not None and self.rendered_seq >= msn
+
+    def reload_delay(self, started):
+        """
+        reload_delay returns how long to wait before
+        the next reload, measured from started.
+        After new segments, wait the target duration,
+        otherwise wait half of it, as RFC 8216 section 6.3.4 asks.
+        """
+        if not self.reload:
+            return 0
+        delay = self.target_duration()
+        if not self.new_segments:
+            delay /= 2
+        return max(delay - (time.monotonic() - started), 0)
+
+    def _read_headers(self, m3u8_lines):
+        """
+        _read_headers parses the header lines
+        at the top of the m3u8 and returns
+        the index of the first segment line.
+        """
+        self.msn = 0
+        for idx, line in enumerate(m3u8_lines):
+            line = self._clean_line(line)
+            if line and not self._parse_header(line):
+                return idx
+        return len(m3u8_lines)
+
+    def _find_tail(self, m3u8_lines, body):
+        """
+        _find_tail walks back from the end of the m3u8
+        to the last processed uri and returns the index
+        of the line after it, or body if the last processed
+        uri is no longer in the m3u8.
+        """
+        if self.last_uri is None or self.msn > self.last_msn:
+            return body
+        for idx in range(len(m3u8_lines) - 1, body - 1, -1):
+            if self._clean_line(m3u8_lines[idx]) == self.last_uri:
+                self.msn = self.last_msn + 1
+                return idx + 1
+        return body
+
+    def _http_m3u8(self):
+        """
+        _http_m3u8 fetches the m3u8 with If-None-Match
+        and If-Modified-Since, returns None on 304 Not Modified.
+        """
+        conditional = {}
+        if self.etag:
+            conditional["If-None-Match"] = self.etag
+        if self.last_modified:
+            conditional["If-Modified-Since"] = self.last_modified
+        try:
+            with reader(self.m3u8, headers=conditional) as self.manifest:
+                self.etag = self.manifest.headers.get("ETag")
+                self.last_modified = self.manifest.headers.get("Last-Modified")
+                self.source_changed = self._http_time(self.last_modified)
+                return self.manifest.readlines()
+        except HTTPError as err:
+            if err.code == 304:
+                return None
+            raise
 
     @staticmethod
-    def clobber_file(the_file):
+    def _http_time(value):
         """
-        clobber_file  blanks the_file
+        _http_time returns an http date header
+        as a unix timestamp, or None.
         """
-        with open(the_file, "w", encoding="utf8") as clobbered:
-            clobbered.close()
+        if not value:
+            return None
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return None
 
-    def pnum(self):
+    def _file_m3u8(self):
         """
-        pnum returns the internal process number
-        for the rendition process
+        _file_m3u8 reads a local m3u8,
+        returns None if mtime and size have not changed.
         """
-        return f"{ON}proc: {self.args.output_dir[-1]}"
+        stat = os.stat(self.m3u8)
+        m3u8_stat = (stat.st_mtime_ns, stat.st_size)
+        if m3u8_stat == self.m3u8_stat:
+            return None
+        self.m3u8_stat = m3u8_stat
+        self.source_changed = stat.st_mtime
+        with reader(self.m3u8) as self.manifest:
+            return self.manifest.readlines()
 
-    def load_sidecar(self):
+    def read_m3u8(self):
+        """
+        read_m3u8 reloads the m3u8 and parses
+        only the lines after the last processed uri.
+        read_m3u8 returns the number of new segments.
+        """
+        self.new_segments = 0
+        now = time.monotonic()
+        if self.last_reload is not None:
+            self.metrics.observe("reload_interval_seconds", now - self.last_reload)
+        self.last_reload = now
+        self.metrics.inc("playlist_reloads_total")
+        with self.metrics.timer("playlist_fetch_seconds"):
+            if self.m3u8.startswith("http"):
+                m3u8_lines = self._http_m3u8()
+            else:
+                m3u8_lines = self._file_m3u8()
+        if m3u8_lines is None:
+            self.metrics.inc("playlist_unchanged_total")
+            return 0
+        self.chunk = []
+        if self.first:
+            self._get_window_size(m3u8_lines)
+        body = self._read_headers(m3u8_lines)
+        tail = self._find_tail(m3u8_lines, body)
+        self._lookahead(m3u8_lines[tail:])
+        for line in m3u8_lines[tail:]:
+            if not self._parse_line(line):
+                break
+        return self.new_segments
+
+    def _header_bytes(self):
+        """
+        _header_bytes returns the headers as encoded m3u8 lines.
         """
-        load_sidecar reads (pts, cue) pairs from
-        the sidecar file and loads them into X9K3.sidecar
+        lines = []
+        for k, v in self.headers.items():
+            if k == "#EXT-X-MEDIA-SEQUENCE" and self.segments:
+                v = self.segments[0].seq
+            if k == "#EXT-X-VERSION" and self.byterange:
+                if isinstance(v, int) and v < 4:
+                    v = 4
+            if v is None:
+                lines.append(f"{k}\n")
+            else:
+                lines.append(f"{k}:{v}\n")
+        if self.origin:
+            lines.append("#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES\n")
+        return "".join(lines).encode()
+
+    def render(self):
+        """
+        render returns the m3u8 as bytes,
+        built from the cached segment stanzas.
+        The key in effect is written before the first
+        segment, when its #EXT-X-KEY has left the window.
+        """
+        blocks = [self._header_bytes()]
+        if self.segments:
+            blocks.append(self.segments[0].key_bytes())
+        blocks.extend(segment.as_bytes() for segment in self.segments)
+        return b"".join(blocks)
+
+    def write_m3u8(self):
+        """
+        write_m3u8 renders the m3u8.
+        With an Origin, the render is served from memory,
+        otherwise it is written to output_dir.
+        """
+        with self.metrics.timer("manifest_write_seconds"):
+            self.rendered = self.render()
+            if self.segments:
+                self.rendered_seq = self.segments[-1].seq
+            if self.origin:
+                self.origin.publish()
+            else:
+                out = self.mk_uri(self.output, self.outfile)
+                with open(out, "wb") as npm3u8:
+                    npm3u8.write(self.rendered)
+        self._published()
+
+    def _published(self):
+        """
+        _published records the cue to publish latency
+        and the lag behind the source playlist.
+        """
+        if self.cue_due is not None:
+            self.metrics.observe("cue_publish_seconds", time.monotonic() - self.cue_due)
+            self.cue_due = None
+        if self.source_changed:
+            lag = max(time.time() - self.source_changed, 0)
+            self.metrics.set("live_edge_lag_seconds", round(lag, 6))
+
+    def _add_cue(self, insert_pts, cue, decoded=None):
+        """
+        _add_cue adds a cue to X9K3.sidecar,
+        an insert_pts of 0 means insert it now.
+        """
+        self.log.info("-> loading  %s,%s", insert_pts, cue)
+        if not insert_pts:
+            insert_pts = self.start
+        try:
+            if self.sidecar.add(insert_pts, cue, decoded):
+                self.cue_arrivals[(insert_pts, cue)] = time.monotonic()
+        except ValueError as err:
+            self.log.warning("-> %s", err)
+
+    def _load_cue_queue(self):
         """
-        if self.sidecar_file:
-            if not self.start:
+        _load_cue_queue adds the cues
+        the parent process has sent.
+        """
+        while True:
+            try:
+                insert_pts, cue, decoded = self.cue_queue.get_nowait()
+            except queue.Empty:
                 return
-            with reader(self.sidecar_file) as sidefile:
-                sidelines = sidefile.readlines()
-                if sidelines == self.last_sidelines:
-                    return
-                for line in sidelines:
-                    line = line.decode().strip().split("#", 1)[0]
-                    if line:
-                        print(f"{self.pnum()} -> loading  {line}{OFF}")
-                        if float(line.split(",", 1)[0]) == 0.0:
-                            line = f'{self.start},{line.split(",",1)[1]}'
-                        self.add2sidecar(line)
-                sidefile.close()
-                self.last_sidelines = sidelines
-            self.clobber_file(self.sidecar_file)
+            self._add_cue(insert_pts, cue, decoded)
+
+    def load_sidecar(self):
+        """
+        load_sidecar loads new (pts, cue) pairs into X9K3.sidecar,
+        from cue_queue when the parent process reads the sidecar,
+        or from the sidecar file.
+        The sidecar file is only read when it changes,
+        and only from where the last read stopped.
+        """
+        if not self.start:
+            return
+        if self.cue_queue is not None:
+            self._load_cue_queue()
+        elif self.sidecar_file:
+            if not self.sidewatch:
+                self.sidewatch = SideWatch(self.sidecar_file)
+            for line in self.sidewatch.read():
+                try:
+                    parsed = self.sidecar.parse_line(line)
+                except ValueError as err:
+                    self.log.warning("-> %s", err)
+                    continue
+                if parsed:
+                    self._add_cue(*parsed)
 
     def add2sidecar(self, line):
         """
-        add2sidecar add insert_pts,cue to the deque
+        add2sidecar adds insert_pts,cue to the CueSchedule
         """
-        insert_pts, cue = line.split(",", 1)
-        insert_pts = float(insert_pts)
-        if [insert_pts, cue] not in self.sidecar:
-            self.sidecar.append([insert_pts, cue])
-            self.sidecar = deque(sorted(self.sidecar, key=itemgetter(0)))
+        try:
+            parsed = self.sidecar.parse_line(line)
+            if parsed:
+                self.sidecar.add(*parsed)
+        except ValueError as err:
+            self.log.warning("-> %s", err)
 
     def _chk_sidecar_cues(self, segment):
         """
-        _chk_sidecar_cues checks the insert pts time
-        for the next sidecar cue and inserts the cue if needed.
+        _chk_sidecar_cues inserts the sidecar cues
+        with an insert pts time in the segment,
+        and drops cues that are too late to insert.
         """
-        self.load_sidecar()
-        if self.sidecar:
-            for s in list(self.sidecar):
-                splice_pts = float(s[0])
-                splice_cue = s[1]
-                if splice_pts:
-                    # half =segment.duration/2
-                    # if (segment.start -half) <= splice_pts <= (segment.start + half):
-                    if segment.start <= splice_pts <= segment.end:
-                        print(
-                            f"{ON}{self.pnum()}-> SPLICE TIME: {splice_pts} ACTUAL:{segment.start}{OFF}"
-                        )
-                        print(
-                            f"{self.pnum()} {REV}SPLICE DIFF: {round(segment.start -splice_pts,6)}{NORM}"
-                        )
-                        self.sidecar.remove(s)
-                        self.scte35.cue = Cue(splice_cue)
-                        self.scte35.cue.decode()
-                        print(
-                            f"{ON}{self.pnum()}  -> {self.scte35.cue.command.name}{OFF}"
-                        )
-                        self._chk_cue_time()
+        if not self.sidecar or not segment.start:
+            return
+        for splice_pts, splice_cue, decoded in self.sidecar.prune(segment.start):
+            self.cue_arrivals.pop((splice_pts, splice_cue), None)
+            self.log.warning("-> dropping late cue %s,%s", splice_pts, splice_cue)
+        for splice_pts, splice_cue, decoded in self.sidecar.pop_between(
+            segment.start, segment.end
+        ):
+            arrived = self.cue_arrivals.pop((splice_pts, splice_cue), 0)
+            if splice_pts:
+                self.metrics.inc("cues_total")
+                if self.cue_due is None:
+                    self.cue_due = max(arrived, self.last_reload or 0)
+                self.log.info("-> SPLICE TIME: %s ACTUAL:%s", splice_pts, segment.start)
+                self.log.info("SPLICE DIFF: %s", round(segment.start - splice_pts, 6))
+                self.scte35.cue = decoded
+                self.log.info("-> %s", self.scte35.cue.command.name)
+                self._chk_cue_time()
 
     def _disco_seq_plus_one(self):
         if "#EXT-X-DISCONTINUITY" in segments[0].tags:
@@ -796,7 +1438,7 @@ class Sideways:
                 self.scte35.cue_state = "IN"
         tag = self.scte35.mk_cue_tag()
         if tag:
-            print(tag)
+            self.log.info("%s", tag)
             if self.scte35.cue_state in ["OUT", "IN"]:
                 self._add_discontinuity(segment)
             kay = tag
@@ -836,57 +1478,366 @@ class Sideways:
 
 
 class UMZZnp(UMZZ):
+    """
+    UMZZnp starts a Sideways process for each rendition.
+    shared is an optional Manager dict
+    the renditions use as a ShareCache.
+    The parent process reads the sidecar,
+    decodes each cue once, and sends it to every rendition.
+    With --metrics, renditions send their metrics
+    to hub, a MetricsHub in the parent process.
+    Renditions put their log records on log_queue,
+    for a LogWriter in the parent process.
+    """
+
+    def __init__(self, m3u8_list, args=None, shared=None, hub=None, log_queue=None):
+        super().__init__(m3u8_list, args=args)
+        self.shared = shared
+        self.log_queue = log_queue
+        self.sidewatch = None
+        self.cue_queues = []
+        self.sent = SeenMedia(SENT_CUES)
+        self.lock = threading.Lock()
+        self.listener = None
+        self.hub = hub
+        if hub is None and getattr(self.args, "metrics", None):
+            self.hub = MetricsHub(self.args.metrics)
+        self.metrics_queues = []
+
+    def _mk_cue_queue(self):
+        cue_queue = mp.Queue()
+        cue_queue.cancel_join_thread()
+        self.cue_queues.append(cue_queue)
+        return cue_queue
+
+    def _mk_metrics_queue(self):
+        if not self.hub:
+            return None
+        metrics_queue = mp.Queue()
+        metrics_queue.cancel_join_thread()
+        self.metrics_queues.append(metrics_queue)
+        return metrics_queue
 
     def add_rendition(self, m3u8, dir_name, rendition_sidecar=None):
         """
         add_rendition starts a process for each rendition and
-        creates a pipe for each rendition to receive SCTE-35.
+        creates a queue for each rendition to receive SCTE-35,
+        and one to send metrics when there is a hub.
         """
         p = mp.Process(
             target=npmp_run,
-            args=(m3u8, dir_name, rendition_sidecar),
+            args=(
+                m3u8,
+                dir_name,
+                None,
+                self.shared,
+                self._mk_cue_queue(),
+                self._mk_metrics_queue(),
+                self.log_queue,
+            ),
         )
         p.start()
-        print(f"{ON}Rendition Process Started {dir_name}{OFF}")
+        LOGGER.info("Rendition Process Started %s", dir_name)
         self.procs.append(p)
 
+    def _mk_rendition_sidecar(self, dir_name):
+        """
+        _mk_rendition_sidecar returns None,
+        renditions get cues from the parent process
+        instead of a sidecar copy.
+        """
+        return None
+
+    def send_cue(self, insert_pts, cue):
+        """
+        send_cue decodes cue and sends it to every rendition.
+        Returns False for duplicates of the last SENT_CUES cues,
+        raises ValueError for cues that do not decode.
+        Cues with an insert_pts of 0 are inserted now,
+        they are never duplicates.
+        """
+        key = (insert_pts, cue)
+        with self.lock:
+            if insert_pts and key in self.sent:
+                return False
+        decoded = CueSchedule.decode(cue)
+        with self.lock:
+            if insert_pts:
+                if key in self.sent:
+                    return False
+                self.sent.add(key)
+            for cue_queue in self.cue_queues:
+                cue_queue.put((insert_pts, cue, decoded))
+        return True
 
-def mk_npmp(manifest, dir_name, rendition_sidecar):
+    def _start_listener(self):
+        """
+        _start_listener starts a CueListener
+        for the --listen urls.
+        """
+        urls = getattr(self.args, "listen", None)
+        if urls and not self.listener:
+            self.listener = CueListener(self.send_cue, urls)
+            self.listener.start()
+
+    def _chk_metrics(self):
+        """
+        _chk_metrics collects rendition metrics
+        and publishes them.
+        """
+        if self.hub:
+            for metrics_queue in self.metrics_queues:
+                self.hub.drain(metrics_queue)
+            self.hub.publish()
+
+    def _chk_alive(self):
+        """
+        _chk_alive starts the cue listener and metrics,
+        then checks the master sidecar and metrics
+        until the rendition processes are finished.
+        """
+        self._start_listener()
+        if self.hub:
+            self.hub.start()
+        while True in [p.is_alive() for p in self.procs]:
+            self._chk_master_sidecar()
+            self._chk_metrics()
+            time.sleep(0.2)
+        if self.hub:
+            self._chk_metrics()
+            self.hub.publish(force=True)
+        sys.exit()
+
+    def _chk_master_sidecar(self):
+        """
+        _chk_master_sidecar sends cues
+        as they are added to the master sidecar.
+        """
+        if self.sidecar:
+            if not self.sidewatch:
+                self.sidewatch = SideWatch(self.sidecar)
+            for line in self.sidewatch.read():
+                try:
+                    parsed = CueSchedule.parse_line(line)
+                except ValueError as err:
+                    LOGGER.warning("%s", err)
+                    continue
+                if parsed:
+                    try:
+                        self.send_cue(*parsed)
+                    except ValueError as err:
+                        LOGGER.warning("%s", err)
+
+
+class UMZZaio(UMZZnp):
+    """
+    UMZZaio adds each rendition to an AioEngine
+    instead of starting a process for it.
+    The renditions share cache, a SegmentCache, when it is set.
+    """
+
+    def __init__(
+        self,
+        m3u8_list,
+        args=None,
+        shared=None,
+        engine=None,
+        origin=None,
+        hub=None,
+        cache=None,
+    ):
+        super().__init__(m3u8_list, args=args, shared=shared, hub=hub)
+        self.engine = engine
+        self.origin = origin
+        self.cache = cache
+
+    def add_rendition(self, m3u8, dir_name, rendition_sidecar=None):
+        """
+        add_rendition adds a Sideways instance
+        for the rendition to the engine.
+        """
+        sway = mk_npmp(m3u8, dir_name, None, self.shared, self.args)
+        sway.cache = self.cache
+        sway.cue_queue = queue.SimpleQueue()
+        self.cue_queues.append(sway.cue_queue)
+        if self.origin:
+            self.origin.add(sway)
+        if self.hub:
+            self.hub.add(sway.metrics)
+        self.engine.add(sway)
+        LOGGER.info("Rendition Coroutine Added %s", dir_name)
+
+    def _chk_alive(self):
+        """
+        _chk_alive starts the cue listener and has the engine
+        check the master sidecar instead of waiting on rendition processes.
+        """
+        self._start_listener()
+        self.engine.watch(self._chk_master_sidecar)
+        if self.hub:
+            self.hub.start()
+            self.engine.watch(self._chk_metrics)
+
+
+def mk_npmp(
+    manifest,
+    dir_name,
+    rendition_sidecar,
+    shared=None,
+    args=None,
+    cue_queue=None,
+    metrics_queue=None,
+):
     """
     mk_npmp generates an Sideways instance and
     sets default values
     """
-    sway = Sideways(argue())
+    if args is None:
+        args = argue()
+    sway = Sideways(argparse.Namespace(**vars(args)))
+    sway.metrics.labels.update(
+        channel=args.input, rendition=os.path.basename(os.path.normpath(dir_name))
+    )
     sway.args.output_dir = dir_name
     sway.args.input = manifest.media
     sway.args.sidecar = rendition_sidecar
+    if shared is not None:
+        sway.share = ShareCache(shared)
+    sway.cue_queue = cue_queue
+    sway.metrics_queue = metrics_queue
     return sway
 
 
-def npmp_run(manifest, dir_name, rendition_sidecar=None):
+def npmp_run(
+    manifest,
+    dir_name,
+    rendition_sidecar=None,
+    shared=None,
+    cue_queue=None,
+    metrics_queue=None,
+    log_queue=None,
+):
     """
     mp_run is the process started for each rendition.
+    With --profile, the rendition is profiled
+    to a profile file in dir_name.
+    Log records are put on log_queue, when there is one.
     """
-    sway = mk_npmp(manifest, dir_name, rendition_sidecar)
-    sway.decode()
+    sway = mk_npmp(
+        manifest,
+        dir_name,
+        rendition_sidecar,
+        shared,
+        cue_queue=cue_queue,
+        metrics_queue=metrics_queue,
+    )
+    if log_queue is not None:
+        worker_logging(log_queue, sway.args)
+    with profiled(sway.args.profile, dir_name):
+        sway.decode()
     return False
 
 
-def do(args):
+def _mk_master(args):
     """
-    do runs sideways programmatically.
-
+    _mk_master decodes the master.m3u8 in args.input
     """
     fu = M3uFu(shush=True)
     if not args.input:
-        print("input source required (Set args.input)")
+        LOGGER.error("input source required (Set args.input)")
         sys.exit()
     fu.m3u8 = args.input
     if not os.path.isdir(args.output_dir):
         os.mkdir(args.output_dir)
     fu.decode()
-    um = UMZZnp(fu.segments)
-    um.go()
+    return fu
+
+
+def do_aio(args_list, workers=4):
+    """
+    do_aio runs the renditions of one or more
+    master.m3u8 files as coroutines in one process.
+    Each args in args_list needs its own input and output_dir.
+    If args.origin is set, an Origin serves the output_dirs.
+    The renditions share one SegmentCache of --cache_mb.
+    With --profile, the process and its pool threads
+    are profiled to a profile file in the first output_dir.
+    Log records are written by a LogWriter thread.
+
+    """
+    writer = LogWriter(args_list[0]).start()
+    engine = AioEngine(workers=workers)
+    origin = None
+    hub = None
+    cache = None
+    try:
+        targets = [args.metrics for args in args_list if args.metrics]
+        if targets:
+            hub = MetricsHub(targets[0])
+        sizes = [args.cache_mb for args in args_list if args.cache_mb]
+        if sizes:
+            cache = SegmentCache(sizes[0] << 20)
+        addresses = [args.origin for args in args_list if args.origin]
+        if addresses:
+            dirs = [os.path.abspath(args.output_dir) for args in args_list]
+            root = dirs[0]
+            if len(dirs) > 1:
+                root = os.path.commonpath(dirs)
+            origin = Origin(root, addresses[0])
+        for args in args_list:
+            fu = _mk_master(args)
+            shared = None
+            if args.shared_cache:
+                shared = {}
+            um = UMZZaio(
+                fu.segments,
+                args=args,
+                shared=shared,
+                engine=engine,
+                origin=origin,
+                hub=hub,
+                cache=cache,
+            )
+            um.go()
+        if origin:
+            origin.start()
+        with profiled(
+            args_list[0].profile, args_list[0].output_dir, per_thread=True
+        ) as profiler:
+            if profiler:
+                engine.initializer = profiler.profile_thread
+            engine.run()
+    finally:
+        if origin:
+            origin.stop()
+        if hub:
+            hub.publish(force=True)
+            hub.stop()
+        writer.stop()
+
+
+def do(args):
+    """
+    do runs sideways programmatically.
+    With the mp engine, rendition processes
+    put log records on a queue, written
+    by a LogWriter thread in this process.
+
+    """
+    if args.engine == "aio" or args.origin:
+        do_aio([args], workers=args.workers)
+        sys.exit()
+    writer = LogWriter(args, mp.Queue()).start()
+    try:
+        fu = _mk_master(args)
+        shared = None
+        if args.shared_cache:
+            manager = mp.Manager()
+            shared = manager.dict()
+        um = UMZZnp(fu.segments, args=args, shared=shared, log_queue=writer.queue)
+        um.go()
+    finally:
+        writer.stop()
 
 
 def argue():
@@ -918,6 +1869,130 @@ def argue():
         default="x_cue",
         help=f"x_scte35, x_cue, x_daterange, or x_splicepoint  default: {ON}x_cue{OFF}",
     )
+    parser.add_argument(
+        "-p",
+        "--probe_bytes",
+        type=int,
+        default=188 * 256,
+        help=f"bytes read to probe a segment for PTS, 0 reads whole segments default: {ON}48128{OFF}",
+    )
+    parser.add_argument(
+        "-m",
+        "--cache_mb",
+        type=int,
+        default=16,
+        help=f"segment byte cache size in MB, 0 disables it default: {ON}16{OFF}",
+    )
+    parser.add_argument(
+        "-l",
+        "--lookahead",
+        type=int,
+        default=3,
+        help=f"prefetch and index segments when a cue is within LOOKAHEAD target durations, 0 disables it default: {ON}3{OFF}",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeline",
+        action="store_const",
+        default=False,
+        const=True,
+        help="Extrapolate segment start from EXTINF, probe PTS only when needed",
+    )
+    parser.add_argument(
+        "-d",
+        "--drift_check",
+        type=int,
+        default=10,
+        help=f"with --timeline, probe PTS every DRIFT_CHECK segments, 0 never default: {ON}10{OFF}",
+    )
+    parser.add_argument(
+        "-c",
+        "--shared_cache",
+        action="store_const",
+        default=False,
+        const=True,
+        help="Share PTS probes and splice points between aligned renditions",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        default="mp",
+        choices=["mp", "aio"],
+        help=f"mp runs a process per rendition, aio runs renditions as coroutines in one process default: {ON}mp{OFF}",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help=f"with --engine aio, threads for reloads, probes and splits default: {ON}4{OFF}",
+    )
+    parser.add_argument(
+        "-b",
+        "--byterange",
+        action="store_const",
+        default=False,
+        const=True,
+        help="Split segments with #EXT-X-BYTERANGE instead of writing a- and b- segments",
+    )
+    parser.add_argument(
+        "-O",
+        "--origin",
+        default=None,
+        help=f"serve output over http on [host:]port, runs the aio engine default: {ON}None{OFF}",
+    )
+    parser.add_argument(
+        "-L",
+        "--listen",
+        action="append",
+        default=None,
+        help=f"accept pts,cue messages on udp://, tcp:// or http://host:port, repeatable default: {ON}None{OFF}",
+    )
+    parser.add_argument(
+        "-M",
+        "--metrics",
+        default=None,
+        help=f"serve Prometheus metrics on [host:]port, or write them to a file path default: {ON}None{OFF}",
+    )
+    parser.add_argument(
+        "-P",
+        "--profile",
+        nargs="?",
+        const="cprofile",
+        default=None,
+        choices=MODES,
+        help=f"profile each rendition process with cprofile, or sample for low overhead, merge the profiles with sideways-profile default: {ON}None{OFF}",
+    )
+    parser.add_argument(
+        "-g",
+        "--log_level",
+        default="info",
+        choices=LEVELS,
+        help=f"log records at or above LOG_LEVEL default: {ON}info{OFF}",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_const",
+        default=False,
+        const=True,
+        help="Log only warnings and errors",
+    )
+    parser.add_argument(
+        "-j",
+        "--json_log",
+        action="store_const",
+        default=False,
+        const=True,
+        help="Log one JSON object per line",
+    )
+    parser.add_argument(
+        "-r",
+        "--log_rate",
+        type=float,
+        default=5,
+        help=f"log at most LOG_RATE debug or info messages a second per rendition, 0 for no limit default: {ON}5{OFF}",
+    )
     parser.add_argument(
         "-v",
         "--version",
@@ -944,7 +2019,8 @@ def cli():
     if args.version:
         print(version())
         sys.exit()
-    _ = {print(k, "=", v) for k, v in vars(args).items()}
+    if not (args.quiet or args.json_log):
+        _ = {print(k, "=", v) for k, v in vars(args).items()}
     do(args)
 
 
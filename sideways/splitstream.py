@@ -1,12 +1,28 @@
+import mmap
+import os
 import sys
 from iframes import IFramer
 from functools import partial
-from new_reader import reader
+from .httppool import reader
+from .npscan import scan
+from .rapindex import RapIndex
+
+PKT_SIZE = 188
 
 
 class SplitStream(IFramer):
-    def __init__(self, shush=True):
+    """
+    SplitStream splits segments at iframes.
+    http(s) segments are read through cache,
+    a SegmentCache, when there is one.
+    Splice points are looked up in index,
+    a RapIndexCache, when there is one.
+    """
+
+    def __init__(self, shush=True, cache=None, index=None):
         self.shush = shush
+        self.cache = cache
+        self.index = index
 
     @staticmethod
     def mk_uri(head, tail):
@@ -20,18 +36,100 @@ class SplitStream(IFramer):
             head = head + sep
         return f"{head}{tail}"
 
-    def split_at(self, segment, pts, output_dir):
-        splice_point = None
+    def _mk_names(self, segment, output_dir):
         seg = segment.rsplit("/")[-1]
         a_name = f"a-{seg.split('?')[0]}"
         b_name = f"b-{seg.split('?')[0]}"
         a_media = self.mk_uri(output_dir, a_name)
         b_media = self.mk_uri(output_dir, b_name)
+        return a_media, b_media
+
+    def find_splice(self, buf, pts, uri=None):
+        """
+        find_splice returns the splice point and byte offset
+        of the first iframe in buf with a PTS at or after pts,
+        or (None, len(buf)).
+        With an index and a uri, buf is indexed once
+        and searched with a binary search.
+        """
+        if self.index and uri:
+            return self.index.get(uri, buf).find(pts)
+        if scan:
+            return RapIndex(buf).find(pts)
+        for idx in range(0, len(buf) - PKT_SIZE + 1, PKT_SIZE):
+            if buf[idx + 1] & 0x40:
+                iframe_pts = self.parse(buf[idx : idx + PKT_SIZE])
+                if iframe_pts and iframe_pts >= pts:
+                    return iframe_pts, idx
+        return None, len(buf)
+
+    @staticmethod
+    def _copy_range(src, dst, offset, count, buf):
+        """
+        _copy_range copies count bytes at offset from src to dst
+        in the kernel with copy_file_range or sendfile,
+        falling back to writing a slice of buf.
+        """
+        copied = 0
+        try:
+            while copied < count:
+                if hasattr(os, "copy_file_range"):
+                    chunk = os.copy_file_range(
+                        src.fileno(), dst.fileno(), count - copied, offset + copied
+                    )
+                else:
+                    chunk = os.sendfile(
+                        dst.fileno(), src.fileno(), offset + copied, count - copied
+                    )
+                if not chunk:
+                    break
+                copied += chunk
+        except OSError:
+            pass
+        if copied < count:
+            dst.write(buf[offset + copied : offset + count])
+
+    def _split_local(self, segment, pts, a_media, b_media):
+        """
+        _split_local maps a local segment into memory,
+        finds the splice packet, and copies each half
+        without reading packets into python.
+        """
+        with open(segment, "rb") as video:
+            size = os.fstat(video.fileno()).st_size
+            with mmap.mmap(video.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                splice_point, offset = self.find_splice(buf, pts, segment)
+                with open(a_media, "wb") as a, open(b_media, "wb") as b:
+                    self._copy_range(video, a, 0, offset, buf)
+                    self._copy_range(video, b, offset, size - offset, buf)
+        return splice_point, a_media, b_media
+
+    def _split_bytes(self, segment, data, pts, a_media, b_media):
+        """
+        _split_bytes splits segment bytes
+        with one write for each half.
+        """
+        splice_point, offset = self.find_splice(data, pts, segment)
+        with open(a_media, "wb") as a, open(b_media, "wb") as b:
+            a.write(data[:offset])
+            b.write(data[offset:])
+        return splice_point, a_media, b_media
+
+    def split_data(self, segment, data, pts, output_dir):
+        """
+        split_data splits data, the bytes of segment
+        already in memory, into a- and b- segments.
+        """
+        a_media, b_media = self._mk_names(segment, output_dir)
+        return self._split_bytes(segment, data, pts, a_media, b_media)
+
+    def _split_stream(self, segment, pts, a_media, b_media):
+        splice_point = None
         with open(a_media, "wb") as a:
             with open(b_media, "wb") as b:
                 outfile = a
                 with reader(segment) as video:
-                    for pkt in iter(partial(video.read, 188), b""):
+                    for pkt in iter(partial(video.read, PKT_SIZE), b""):
                         if not splice_point:
                             iframe_pts = self.parse(pkt)
                             if iframe_pts:
@@ -40,3 +138,55 @@ class SplitStream(IFramer):
                                     outfile = b
                         outfile.write(pkt)
         return splice_point, a_media, b_media
+
+    def splice_range(self, segment, pts):
+        """
+        splice_range returns the splice point,
+        the byte offset of the splice packet,
+        and the size of segment, without writing any files.
+        """
+        if not segment.startswith("http") and os.path.isfile(segment):
+            with open(segment, "rb") as video:
+                size = os.fstat(video.fileno()).st_size
+                if size:
+                    with mmap.mmap(video.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                        splice_point, offset = self.find_splice(buf, pts, segment)
+                        return splice_point, offset, size
+        if self.cache and segment.startswith("http"):
+            data = self.cache.get(segment)
+            splice_point, offset = self.find_splice(data, pts, segment)
+            return splice_point, offset, len(data)
+        splice_point = None
+        offset = 0
+        size = None
+        with reader(segment) as video:
+            if hasattr(video, "headers"):
+                length = video.headers.get("Content-Length")
+                if length and length.isdigit():
+                    size = int(length)
+            for pkt in iter(partial(video.read, PKT_SIZE), b""):
+                iframe_pts = self.parse(pkt)
+                if iframe_pts and iframe_pts >= pts:
+                    splice_point = iframe_pts
+                    break
+                offset += len(pkt)
+            if size is None:
+                size = offset + sum(
+                    len(chunk) for chunk in iter(partial(video.read, 65536), b"")
+                )
+        return splice_point, offset, size
+
+    def split_at(self, segment, pts, output_dir):
+        """
+        split_at splits segment into a- and b- segments
+        at the first iframe with a PTS at or after pts.
+        Local segments are split with mmap and kernel copies.
+        """
+        a_media, b_media = self._mk_names(segment, output_dir)
+        if not segment.startswith("http") and os.path.isfile(segment):
+            if os.path.getsize(segment):
+                return self._split_local(segment, pts, a_media, b_media)
+        if self.cache and segment.startswith("http"):
+            data = self.cache.get(segment)
+            return self._split_bytes(segment, data, pts, a_media, b_media)
+        return self._split_stream(segment, pts, a_media, b_media)
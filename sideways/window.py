@@ -0,0 +1,151 @@
+"""
+window.py
+"""
+
+import sys
+from collections import deque
+
+
+class SegmentRecord:
+    """
+    SegmentRecord is what is kept of a Segment
+    once it is in the window, the rendered stanza,
+    the sequence and timing of the segment,
+    and the #EXT-X-KEY line in effect for it.
+    """
+
+    __slots__ = ("seq", "media", "start", "duration", "stanza", "key")
+
+    def __init__(self, segment):
+        self.seq = segment.seq
+        self.media = segment.media
+        self.start = segment.start
+        self.duration = segment.duration
+        self.stanza = segment.as_bytes()
+        self.key = getattr(segment, "key_line", None)
+
+    def __repr__(self):
+        return f"SegmentRecord({self.seq}, {self.media}, {self.start})"
+
+    def as_bytes(self):
+        """
+        as_bytes returns the stanza as encoded m3u8 lines.
+        """
+        return self.stanza
+
+    def key_bytes(self):
+        """
+        key_bytes returns the #EXT-X-KEY line in effect
+        when the stanza does not have one, or b"".
+        """
+        if self.key and b"#EXT-X-KEY:" not in self.stanza:
+            return self.key
+        return b""
+
+    def nbytes(self):
+        """
+        nbytes returns the approximate size of the record.
+        """
+        return sys.getsizeof(self) + sys.getsizeof(self.stanza)
+
+
+class SegmentWindow:
+    """
+    SegmentWindow is a ring buffer of the SegmentRecords
+    in the rendition index.m3u8.
+    It never holds more than size records,
+    however many segments a reload adds.
+    """
+
+    def __init__(self, size=100):
+        self.records = deque(maxlen=max(size, 1))
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, idx):
+        return self.records[idx]
+
+    def resize(self, size):
+        """
+        resize sets how many records the window holds,
+        dropping the oldest if it shrinks.
+        """
+        size = max(size, 1)
+        if size != self.records.maxlen:
+            self.evicted += max(len(self.records) - size, 0)
+            self.records = deque(self.records, maxlen=size)
+
+    def append(self, segment):
+        """
+        append adds a SegmentRecord of segment
+        and returns it, evicting the oldest record
+        when the window is full.
+        """
+        record = SegmentRecord(segment)
+        if len(self.records) == self.records.maxlen:
+            self.evicted += 1
+        self.records.append(record)
+        return record
+
+    def nbytes(self):
+        """
+        nbytes returns the approximate size of the window.
+        """
+        return sys.getsizeof(self.records) + sum(
+            record.nbytes() for record in self.records
+        )
+
+
+class SeenMedia:
+    """
+    SeenMedia is a bounded set of the
+    most recent segment URIs, or other keys, in arrival order.
+    """
+
+    def __init__(self, size=100):
+        self.order = deque()
+        self.members = set()
+        self.size = max(size, 1)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, media):
+        return media in self.members
+
+    def resize(self, size):
+        """
+        resize sets how many URIs are kept.
+        """
+        self.size = max(size, 1)
+        self._trim()
+
+    def _trim(self):
+        while len(self.order) > self.size:
+            self.members.discard(self.order.popleft())
+
+    def add(self, media):
+        """
+        add remembers media, forgetting the oldest
+        URIs beyond size.
+        """
+        if media in self.members:
+            return
+        self.members.add(media)
+        self.order.append(media)
+        self._trim()
+
+    def nbytes(self):
+        """
+        nbytes returns the approximate size of the set.
+        """
+        return (
+            sys.getsizeof(self.order)
+            + sys.getsizeof(self.members)
+            + sum(sys.getsizeof(media) for media in self.order)
+        )
@@ -0,0 +1,48 @@
+"""
+conftest.py
+"""
+
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+from sideways.sideways import Sideways, argue
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+)
+
+
+@pytest.fixture
+def serve():
+    """
+    serve starts a ThreadingHTTPServer for a handler class
+    on a free port and returns its base url.
+    """
+    servers = []
+
+    def _serve(handler):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield _serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def sway(monkeypatch, tmp_path):
+    """
+    sway returns a Sideways instance with default args
+    writing to tmp_path.
+    """
+    monkeypatch.setattr(sys, "argv", ["sideways"])
+    sway = Sideways(argue())
+    sway.args.output_dir = str(tmp_path)
+    sway.args.sidecar = None
+    return sway
@@ -0,0 +1,119 @@
+"""
+test_aes.py
+"""
+
+import pyaes
+import pytest
+import fixtures
+from sideways import aes
+from sideways.aes import CHUNK, AesDecrypter, KeyCache, key_tag, mk_iv, unpad
+from sideways.segcache import SegmentCache
+
+KEY = bytes(range(16))
+IV = mk_iv(None, 7)
+
+
+def encrypt(plain, pad=True):
+    """
+    encrypt returns plain AES-128 CBC encrypted with KEY and IV,
+    PKCS#7 padded when pad is set.
+    """
+    padding = "default" if pad else "none"
+    encrypter = pyaes.Encrypter(pyaes.AESModeOfOperationCBC(KEY, iv=IV), padding)
+    return encrypter.feed(plain) + encrypter.feed()
+
+
+@pytest.fixture(params=["cryptography", "pyaes"])
+def segment(request, monkeypatch, tmp_path):
+    """
+    segment writes a key and an encrypted TS segment to tmp_path
+    and returns (AesDecrypter, media, key_uri, plaintext),
+    decrypting with cryptography or pyaes.
+    """
+    if request.param == "pyaes":
+        monkeypatch.setattr(aes, "Cipher", None)
+    elif aes.Cipher is None:
+        pytest.skip("cryptography is not installed")
+    plain, _ = fixtures.ts_segment(10.0, duration=2.0, pkts_per_frame=3)
+    key_uri = tmp_path / "key.bin"
+    key_uri.write_bytes(KEY)
+    media = tmp_path / "seg7.ts"
+    media.write_bytes(encrypt(plain))
+    return AesDecrypter(keys=KeyCache()), str(media), str(key_uri), plain
+
+
+def test_decrypt(segment):
+    decrypter, media, key_uri, plain = segment
+    assert bytes(decrypter.decrypt(media, key_uri, IV)) == plain
+    assert bytes(decrypter.decrypt(media, key_uri, IV)) == plain
+    assert decrypter.keys.stats() == {"hits": 1, "fetches": 1, "items": 1}
+
+
+def test_leading(segment):
+    decrypter, media, key_uri, plain = segment
+    chunks = list(decrypter.leading(media, key_uri, IV))
+    assert len(chunks[0]) == CHUNK
+    assert all(len(chunk) % 188 == 0 for chunk in chunks[:-1])
+    assert b"".join(chunks)[: len(plain)] == plain
+    first = next(decrypter.leading(media, key_uri, IV))
+    assert first == plain[:CHUNK]
+
+
+def test_leading_from_cache(segment):
+    decrypter, media, key_uri, plain = segment
+    decrypter.cache = SegmentCache()
+    with open(media, "rb") as encrypted:
+        decrypter.cache.put(media, encrypted.read())
+    assert b"".join(decrypter.leading(media, key_uri, IV))[: len(plain)] == plain
+
+
+def test_decrypt_bad_padding(segment, tmp_path):
+    decrypter, _, key_uri, _ = segment
+    plain = bytes(45) + b"\x01\x02\x03"
+    media = tmp_path / "unpadded.ts"
+    media.write_bytes(encrypt(plain, pad=False))
+    assert bytes(decrypter.decrypt(str(media), key_uri, IV)) == plain
+
+
+def test_bad_key(tmp_path):
+    key_uri = tmp_path / "short.key"
+    key_uri.write_bytes(b"short")
+    with pytest.raises(ValueError):
+        KeyCache().get(str(key_uri))
+
+
+def test_unpad():
+    assert unpad(b"a" * 13 + b"\x03\x03\x03") == b"a" * 13
+    assert unpad(b"\x10" * 16) == b""
+    assert unpad(b"a" * 13 + b"\x01\x03\x03") == b"a" * 13 + b"\x01\x03\x03"
+    assert unpad(b"a" * 15 + b"\x00") == b"a" * 15 + b"\x00"
+    assert unpad(b"a" * 15 + b"\x11") == b"a" * 15 + b"\x11"
+    assert unpad(b"") == b""
+
+
+def test_mk_iv():
+    assert mk_iv(None, 7) == (7).to_bytes(16, "big")
+    assert mk_iv(None) == bytes(16)
+    assert mk_iv(None, None) == bytes(16)
+    assert mk_iv("0x0000000000000000000000000000000A", 7) == (10).to_bytes(16, "big")
+    assert mk_iv(10, 7) == (10).to_bytes(16, "big")
+    assert mk_iv(0, 7) == bytes(16)
+
+
+def test_key_tag():
+    key = {"METHOD": "AES-128", "URI": "https://cdn/key.bin", "KEYFORMAT": "identity"}
+    assert key_tag(key) == (
+        'METHOD=AES-128,URI="https://cdn/key.bin",KEYFORMAT="identity"'
+    )
+    assert key_tag(key, mk_iv(None, 5)) == (
+        'METHOD=AES-128,URI="https://cdn/key.bin",KEYFORMAT="identity",'
+        "IV=0x00000000000000000000000000000005"
+    )
+
+
+def test_key_tag_iv():
+    key = {"METHOD": "AES-128", "URI": "key.bin", "IV": 255}
+    tag = key_tag(key, mk_iv(None, 5))
+    assert tag == 'METHOD=AES-128,URI="key.bin",IV=0x000000000000000000000000000000FF'
+    assert key_tag({"METHOD": "NONE"}, mk_iv(None, 5)) == "METHOD=NONE"
+    assert key_tag({}) == "METHOD=NONE"
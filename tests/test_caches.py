@@ -0,0 +1,136 @@
+"""
+test_caches.py
+"""
+
+import threading
+import time
+from sideways.segcache import SegmentCache
+from sideways.sharecache import NONE, ShareCache
+
+
+def test_segment_cache_evicts_by_bytes():
+    cache = SegmentCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.peek("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert "b" not in cache
+    assert list(cache.items) == ["a", "c"]
+    assert cache.size == 8
+    cache.put("d", b"dddddddd")
+    assert list(cache.items) == ["d"]
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 0,
+        "evictions": 3,
+        "items": 1,
+        "bytes": 8,
+    }
+
+
+def test_segment_cache_put_replaces():
+    cache = SegmentCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("a", b"aaaaaa")
+    assert cache.size == 6
+    cache.put("a", b"a" * 11)
+    assert "a" not in cache
+    assert cache.size == 0
+    assert cache.evictions == 0
+
+
+def test_segment_cache_drop():
+    cache = SegmentCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bb")
+    cache.drop("a")
+    cache.drop("a")
+    cache.drop("missing")
+    assert list(cache.items) == ["b"]
+    assert cache.size == 2
+    assert cache.peek("a") is None
+
+
+def test_segment_cache_get(tmp_path):
+    seg = tmp_path / "seg0.ts"
+    seg.write_bytes(b"\x47" * 188)
+    cache = SegmentCache()
+    assert cache.get(str(seg)) == b"\x47" * 188
+    seg.write_bytes(b"changed")
+    assert cache.get(str(seg)) == b"\x47" * 188
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_share_get_put():
+    cache = ShareCache({})
+    assert cache.get(("pts", 1)) is None
+    cache.put(("pts", 1), 10.0)
+    cache.put(("pts", 2), None)
+    assert cache.get(("pts", 1)) == 10.0
+    assert cache.get(("pts", 2)) == NONE
+    cache.shared[("pts", 3)] = "pending-other"
+    assert cache.get(("pts", 3)) is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "puts": 2}
+
+
+def test_share_fetch_waits_for_pending():
+    shared = {}
+    first, second = ShareCache(shared), ShareCache(shared)
+    started = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append("first")
+        started.set()
+        time.sleep(0.2)
+        return 10.0
+
+    worker = threading.Thread(target=first.fetch, args=(("pts", 1), slow))
+    worker.start()
+    started.wait(1)
+    assert shared[("pts", 1)] == first.token
+    assert second.fetch(("pts", 1), lambda: calls.append("second")) == 10.0
+    worker.join()
+    assert calls == ["first"]
+    assert second.stats() == {"hits": 1, "misses": 0, "puts": 0}
+    assert first.stats() == {"hits": 0, "misses": 1, "puts": 1}
+
+
+def test_share_fetch_stored_none():
+    shared = {}
+    ShareCache(shared).put(("split", 1), None)
+    assert ShareCache(shared).fetch(("split", 1), lambda: 1 / 0) is None
+
+
+def test_share_fetch_none_is_not_kept():
+    cache = ShareCache({})
+    assert cache.fetch(("pts", 1), lambda: None) is None
+    assert cache.shared == {}
+    assert cache.fetch(("pts", 1), lambda: 10.0) == 10.0
+
+
+def test_share_fetch_stale_pending():
+    shared = {("pts", 1): "pending-gone"}
+    cache = ShareCache(shared, wait=0.05)
+    assert cache.fetch(("pts", 1), lambda: 10.0) == 10.0
+    assert shared[("pts", 1)] == 10.0
+    assert cache.misses == 1
+
+
+def test_share_prune():
+    cache = ShareCache({}, keep=2)
+    for msn in range(6):
+        cache.put(("pts", msn), float(msn))
+    cache.shared[("split", 1)] = 1.0
+    cache.prune(5)
+    assert sorted(cache.shared) == [("pts", 3), ("pts", 4), ("pts", 5)]
+
+
+def test_share_prunes_every_hundred_puts(monkeypatch):
+    pruned = []
+    monkeypatch.setattr(ShareCache, "prune", lambda self, msn: pruned.append(msn))
+    cache = ShareCache({})
+    for msn in range(250):
+        cache.put(("pts", msn), float(msn))
+    assert pruned == [99, 199]
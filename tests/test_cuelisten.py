@@ -0,0 +1,91 @@
+"""
+test_cuelisten.py
+"""
+
+import base64
+import urllib.error
+import urllib.request
+import pytest
+from sideways.cuelisten import CueListener, normalize_cue, send
+from sideways.cueschedule import CueSchedule
+
+CUE = "/DAlAAAAAAAAAP/wFAUAAAABf+/+ACJVEP4AF1iQAAEAAAAA1X+WMw=="
+BINARY = base64.b64decode(CUE)
+
+
+@pytest.fixture
+def listener():
+    """
+    listener runs a CueListener on free udp, tcp
+    and http ports, with a CueSchedule as its sink.
+    """
+    schedule = CueSchedule()
+    listener = CueListener(
+        schedule.add, ["udp://127.0.0.1:0", "tcp://127.0.0.1:0", "http://127.0.0.1:0"]
+    )
+    listener.start()
+    listener.schedule = schedule
+    listener.bound = {
+        url.split(":")[0]: f"{url.rsplit(':', 1)[0]}:{server.server_address[1]}"
+        for url, server in zip(listener.urls, listener.servers)
+    }
+    yield listener
+    listener.stop()
+
+
+@pytest.mark.parametrize("scheme", ["udp", "tcp", "http"])
+def test_acks(listener, scheme):
+    url = listener.bound[scheme]
+    assert send(url, f"10.0,{CUE}\n".encode()) == b"OK 10.0\n"
+    assert send(url, f"10.0,{CUE}\n".encode()) == b"DUP 10.0\n"
+    assert send(url, b"12.0,notacue\n").startswith(b"ERR bad cue")
+    assert send(url, b"nocomma\n").startswith(b"ERR bad sidecar line")
+    assert listener.stats() == {"accepted": 1, "duplicates": 1, "rejected": 1}
+
+
+@pytest.mark.parametrize("scheme", ["udp", "tcp", "http"])
+def test_many_lines(listener, scheme):
+    lines = f"20.0,{CUE}\n# comment\n\n30.0,{CUE}\n20.0,{CUE}\n".encode()
+    assert send(listener.bound[scheme], lines) == b"OK 20.0\nOK 30.0\nDUP 20.0\n"
+
+
+def test_udp_binary(listener):
+    url = listener.bound["udp"]
+    assert send(url, b"40.0," + BINARY) == b"OK 40.0\n"
+    assert send(url, b"40.0," + BINARY) == b"DUP 40.0\n"
+    assert send(url, b"forty," + BINARY).startswith(b"ERR bad pts")
+    assert (40.0, CUE) in listener.schedule.keys
+
+
+def post(url, body, ctype="text/plain"):
+    """
+    post returns (status, body) for a POST to url.
+    """
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": ctype})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as err:
+        return err.code, err.read()
+
+
+def test_http_status(listener):
+    url = listener.bound["http"] + "/"
+    assert post(url, f"50.0,{CUE}\n".encode()) == (200, b"OK 50.0\n")
+    assert post(url, f"50.0,{CUE}\n".encode()) == (200, b"DUP 50.0\n")
+    assert post(url, b"50.0,notacue\n")[0] == 400
+
+
+def test_http_binary(listener):
+    url = listener.bound["http"] + "/?pts=60.0"
+    binary = "application/octet-stream"
+    assert post(url, BINARY, binary) == (200, b"OK 60.0\n")
+    assert post(url, BINARY, binary) == (200, b"DUP 60.0\n")
+    assert (60.0, CUE) in listener.schedule.keys
+
+
+def test_normalize_cue():
+    assert normalize_cue(BINARY) == CUE
+    assert normalize_cue("0x" + BINARY.hex()) == CUE
+    assert normalize_cue(BINARY.hex().encode()) == CUE
+    assert normalize_cue(f" {CUE}\n") == CUE
@@ -0,0 +1,105 @@
+"""
+test_cueschedule.py
+"""
+
+import pytest
+from fixtures import CUE_IN, CUE_OUT
+from sideways.cueschedule import CueSchedule
+
+
+class Segment:
+    """
+    Segment has the times _chk_sidecar_cues reads.
+    """
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+def schedule(*pts):
+    sched = CueSchedule()
+    decoded = CueSchedule.decode(CUE_OUT)
+    for insert_pts in pts:
+        sched.add(insert_pts, CUE_OUT, decoded)
+    return sched
+
+
+def test_parse_line():
+    assert CueSchedule.parse_line(f"10.5,{CUE_OUT}\n") == (10.5, CUE_OUT)
+    assert CueSchedule.parse_line(f"  10 , {CUE_IN} # in".encode()) == (10.0, CUE_IN)
+    assert CueSchedule.parse_line("# comment") is None
+    assert CueSchedule.parse_line("\n") is None
+    with pytest.raises(ValueError):
+        CueSchedule.parse_line("10.5")
+    with pytest.raises(ValueError):
+        CueSchedule.parse_line(f"soon,{CUE_OUT}")
+
+
+def test_bad_cue():
+    sched = CueSchedule()
+    with pytest.raises(ValueError):
+        sched.add(1.0, "not a cue")
+    assert not sched
+    assert not sched.keys
+
+
+def test_duplicates():
+    sched = CueSchedule()
+    assert sched.add(10.0, CUE_OUT)
+    assert not sched.add(10.0, CUE_OUT)
+    assert sched.add(10.0, CUE_IN)
+    assert sched.add(12.0, CUE_OUT)
+    assert len(sched) == 3
+    assert len(sched.keys) == 3
+
+
+def test_out_of_order():
+    sched = schedule(30.0, 10.0, 20.0, 5.0, 20.0, 25.0)
+    assert sched.pts == [5.0, 10.0, 20.0, 25.0, 30.0]
+    assert [entry[0] for entry in sched] == sched.pts
+    sched.add(20.0, CUE_IN)
+    assert sched.pts == [5.0, 10.0, 20.0, 20.0, 25.0, 30.0]
+    assert [entry[1] for entry in sched][2:4] == [CUE_OUT, CUE_IN]
+
+
+def test_between():
+    sched = schedule(5.0, 10.0, 20.0, 25.0)
+    assert [entry[0] for entry in sched.between(10.0, 20.0)] == [10.0, 20.0]
+    assert sched.between(11.0, 19.0) == []
+    assert sched.between(30.0, 40.0) == []
+    assert len(sched) == 4
+
+
+def test_pop_between():
+    sched = schedule(5.0, 10.0, 20.0, 25.0)
+    popped = sched.pop_between(9.0, 20.0)
+    assert [entry[0] for entry in popped] == [10.0, 20.0]
+    assert popped[0][2].command.name == "Splice Insert"
+    assert sched.pts == [5.0, 25.0]
+    assert [entry[0] for entry in sched] == [5.0, 25.0]
+    assert sched.keys == {(5.0, CUE_OUT), (25.0, CUE_OUT)}
+    assert sched.pop_between(9.0, 20.0) == []
+    assert sched.add(10.0, CUE_OUT)
+
+
+def test_prune():
+    sched = schedule(5.0, 10.0, 20.0, 25.0)
+    assert [entry[0] for entry in sched.prune(20.0)] == [5.0, 10.0]
+    assert sched.pts == [20.0, 25.0]
+    assert sched.pruned == 2
+    assert sched.prune(20.0) == []
+    assert sched.pruned == 2
+    assert (5.0, CUE_OUT) not in sched.keys
+
+
+def test_late_cues_dropped(sway):
+    sway.start = 1.0
+    sway._add_cue(5.0, CUE_OUT)
+    sway._add_cue(12.0, CUE_OUT)
+    sway._add_cue(30.0, CUE_IN)
+    sway._chk_sidecar_cues(Segment(10.0, 16.0))
+    assert sway.sidecar.pruned == 1
+    assert sway.sidecar.pts == [30.0]
+    assert list(sway.cue_arrivals) == [(30.0, CUE_IN)]
+    assert sway.scte35.cue.command.name == "Splice Insert"
@@ -0,0 +1,95 @@
+"""
+test_engine.py
+"""
+
+import logging
+from sideways.engine import AioEngine
+from sideways.log import rendition_log
+from sideways.metrics import Metrics
+
+
+class Rendition:
+    """
+    Rendition steps like a Sideways instance,
+    raising on the step numbers in fails.
+    """
+
+    def __init__(self, steps=3, fails=(), setup_fails=False):
+        self.steps = steps
+        self.fails = set(fails)
+        self.setup_fails = setup_fails
+        self.calls = 0
+        self.reload = True
+        self.metrics = Metrics()
+        self.log = rendition_log("test")
+
+    def setup(self):
+        if self.setup_fails:
+            raise FileNotFoundError("no playlist")
+
+    def step(self):
+        self.calls += 1
+        if self.calls >= self.steps:
+            self.reload = False
+        if self.calls in self.fails:
+            raise ConnectionResetError("reset by peer")
+        return 0
+
+    def reload_delay(self, started):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+def run(*renditions, watch=None):
+    engine = AioEngine(workers=2, interval=0.01)
+    for sway in renditions:
+        engine.add(sway)
+    if watch:
+        engine.watch(watch)
+    engine.run()
+
+
+def test_steps_until_reload_stops():
+    sways = [Rendition(steps=3), Rendition(steps=5)]
+    run(*sways)
+    assert [sway.calls for sway in sways] == [3, 5]
+    assert all(sway.closed for sway in sways)
+
+
+def test_failed_step_is_retried(caplog):
+    flaky = Rendition(steps=5, fails=(2, 3))
+    steady = Rendition(steps=5)
+    with caplog.at_level(logging.WARNING, logger="sideways"):
+        run(flaky, steady)
+    assert flaky.calls == 5
+    assert steady.calls == 5
+    assert flaky.metrics.counters["step_errors_total"] == 2
+    assert "reload failed, retrying: reset by peer" in caplog.text
+
+
+def test_failed_setup_stops_only_that_rendition(caplog):
+    broken = Rendition(setup_fails=True)
+    steady = Rendition(steps=3)
+    with caplog.at_level(logging.ERROR, logger="sideways"):
+        run(broken, steady)
+    assert broken.calls == 0
+    assert broken.closed
+    assert steady.calls == 3
+    assert "stopped: no playlist" in caplog.text
+
+
+def test_watchers_run_and_stop():
+    calls = []
+    run(Rendition(steps=2), watch=lambda: calls.append(1))
+    assert calls
+
+
+def test_initializer_runs_in_pool_threads():
+    threads = set()
+    engine = AioEngine(workers=1)
+    engine.initializer = lambda: threads.add("started")
+    engine.add(Rendition(steps=2))
+    engine.run()
+    assert threads == {"started"}
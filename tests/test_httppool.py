@@ -0,0 +1,112 @@
+"""
+test_httppool.py
+"""
+
+from http.server import BaseHTTPRequestHandler
+from urllib.error import HTTPError
+import pytest
+from sideways.httppool import HttpPool
+
+BODY = b"#EXTM3U\n"
+
+
+class KeepAlive(BaseHTTPRequestHandler):
+    """
+    KeepAlive answers every GET on a kept alive connection.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/moved":
+            self.send_response(302)
+            self.send_header("Location", "/index.m3u8")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/missing":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+class HangUp(KeepAlive):
+    """
+    HangUp closes each connection after one response,
+    without saying so, like a server timing out idle connections.
+    """
+
+    def do_GET(self):
+        super().do_GET()
+        self.close_connection = True
+
+
+def fetch(pool, url):
+    with pool.get(url) as resp:
+        return resp.read()
+
+
+def test_reuses_connections(serve):
+    base = serve(KeepAlive)
+    pool = HttpPool()
+    for _ in range(3):
+        assert fetch(pool, f"{base}/index.m3u8") == BODY
+    stats = pool.stats()
+    assert stats["connects"] == 1
+    assert stats["reuses"] == 2
+    assert stats["idle"] == 1
+
+
+def test_unread_response_is_not_reused(serve):
+    base = serve(KeepAlive)
+    pool = HttpPool()
+    with pool.get(f"{base}/index.m3u8") as resp:
+        resp.read(1)
+    assert fetch(pool, f"{base}/index.m3u8") == BODY
+    assert pool.stats()["connects"] == 2
+
+
+def test_retries_stale_connection(serve):
+    base = serve(HangUp)
+    pool = HttpPool()
+    assert fetch(pool, f"{base}/index.m3u8") == BODY
+    assert fetch(pool, f"{base}/index.m3u8") == BODY
+    stats = pool.stats()
+    assert stats["retries"] == 1
+    assert stats["connects"] == 2
+
+
+def test_follows_redirects(serve):
+    base = serve(KeepAlive)
+    pool = HttpPool()
+    with pool.get(f"{base}/moved") as resp:
+        assert resp.url == f"{base}/index.m3u8"
+        assert resp.read() == BODY
+
+
+def test_raises_http_error(serve):
+    base = serve(KeepAlive)
+    pool = HttpPool()
+    with pytest.raises(HTTPError) as err:
+        pool.get(f"{base}/missing")
+    assert err.value.code == 404
+    assert fetch(pool, f"{base}/index.m3u8") == BODY
+    assert pool.stats()["connects"] == 1
+
+
+def test_per_host_limit(serve):
+    base = serve(KeepAlive)
+    pool = HttpPool(per_host=1)
+    first = pool.get(f"{base}/index.m3u8")
+    assert not pool.slots[first.key].acquire(blocking=False)
+    first.read()
+    first.close()
+    assert fetch(pool, f"{base}/index.m3u8") == BODY
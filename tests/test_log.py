@@ -0,0 +1,106 @@
+"""
+test_log.py
+"""
+
+import logging
+import queue
+from types import SimpleNamespace
+import pytest
+from sideways import log
+from sideways.log import ConsoleFormatter, RateLimit, rendition_log, worker_logging
+
+
+class Clock:
+    """
+    Clock is a time.monotonic that only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(log.time, "monotonic", clock)
+    return clock
+
+
+def record(msg, rendition=0, level=logging.INFO):
+    rec = logging.LogRecord("sideways", level, __file__, 1, msg, (), None)
+    rec.rendition = rendition
+    return rec
+
+
+def test_burst_is_dropped(clock):
+    limit = RateLimit(5)
+    passed = [limit.filter(record(f"media: seg{num}.ts")) for num in range(20)]
+    assert passed == [True] * 5 + [False] * 15
+    assert limit.buckets[(0, logging.INFO)][2] == 15
+
+
+def test_suppressed_count(clock):
+    limit = RateLimit(2)
+    for num in range(6):
+        limit.filter(record(f"line {num}"))
+    clock.now += 0.5
+    rec = record("after")
+    assert limit.filter(rec)
+    assert rec.suppressed == 4
+    assert ConsoleFormatter().format(rec).endswith("after (4 similar suppressed)")
+    rec = record("next")
+    assert not limit.filter(rec)
+    assert not hasattr(rec, "suppressed")
+
+
+def test_refills(clock):
+    limit = RateLimit(5)
+    assert sum(limit.filter(record("a")) for _ in range(10)) == 5
+    clock.now += 0.4
+    assert sum(limit.filter(record("a")) for _ in range(10)) == 2
+    clock.now += 10
+    assert sum(limit.filter(record("a")) for _ in range(10)) == 5
+
+
+def test_per_rendition_and_level(clock):
+    limit = RateLimit(1)
+    assert limit.filter(record("a", 0))
+    assert not limit.filter(record("b", 0))
+    assert limit.filter(record("a", 1))
+    assert limit.filter(record("a", 0, logging.DEBUG))
+    assert not limit.filter(record("b", 0, logging.DEBUG))
+
+
+def test_warnings_pass(clock):
+    limit = RateLimit(1)
+    levels = [logging.WARNING, logging.ERROR] * 5
+    assert all(limit.filter(record("w", 0, level)) for level in levels)
+    assert not limit.buckets
+
+
+def test_no_limit(clock):
+    limit = RateLimit(0)
+    assert all(limit.filter(record("a")) for _ in range(100))
+
+
+def test_worker_burst_is_dropped(clock):
+    log_queue = queue.SimpleQueue()
+    level = log.LOGGER.level
+    handler = worker_logging(log_queue, SimpleNamespace(log_rate=3))
+    try:
+        for num in range(10):
+            rendition_log(0).info("media: %s", f"seg{num}.ts")
+            rendition_log(1).info("media: %s", f"seg{num}.ts")
+        rendition_log(0).warning("reload failed")
+    finally:
+        log.LOGGER.removeHandler(handler)
+        log.LOGGER.propagate = True
+        log.LOGGER.setLevel(level)
+    records = []
+    while not log_queue.empty():
+        records.append(log_queue.get())
+    assert [rec.rendition for rec in records] == [0, 1, 0, 1, 0, 1, 0]
+    assert records[-1].getMessage() == "reload failed"
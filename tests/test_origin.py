@@ -0,0 +1,94 @@
+"""
+test_origin.py
+"""
+
+import threading
+import time
+import urllib.error
+import urllib.request
+import pytest
+from sideways.origin import Origin
+
+RENDERED = b"#EXTM3U\n#EXT-X-MEDIA-SEQUENCE:5\n"
+
+
+def get(url):
+    """
+    get returns (status, body) for url.
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as err:
+        return err.code, err.read()
+
+
+@pytest.fixture
+def origin(sway, tmp_path):
+    """
+    origin serves sway, with seq 5 rendered,
+    from an Origin on a free port.
+    """
+    sway.headers["#EXT-X-TARGETDURATION"] = 0.1
+    sway.rendered = RENDERED
+    sway.rendered_seq = 5
+    origin = Origin(str(tmp_path), "127.0.0.1:0")
+    origin.path = origin.add(sway)
+    origin.start()
+    origin.url = f"http://127.0.0.1:{origin.port}"
+    yield origin
+    origin.stop()
+
+
+def test_playlist(origin):
+    assert get(origin.url + origin.path) == (200, RENDERED)
+
+
+def test_not_ready(origin, sway):
+    sway.rendered = b""
+    assert get(origin.url + origin.path)[0] == 503
+
+
+def test_msn_available(origin):
+    assert get(f"{origin.url}{origin.path}?_HLS_msn=5") == (200, RENDERED)
+
+
+def test_msn_too_far_ahead(origin):
+    assert get(f"{origin.url}{origin.path}?_HLS_msn=8")[0] == 400
+
+
+def test_bad_msn(origin):
+    assert get(f"{origin.url}{origin.path}?_HLS_msn=five")[0] == 400
+
+
+def test_msn_times_out(origin):
+    started = time.monotonic()
+    assert get(f"{origin.url}{origin.path}?_HLS_msn=6")[0] == 503
+    assert time.monotonic() - started >= 0.3
+
+
+def test_msn_blocks_until_published(origin, sway):
+    sway.headers["#EXT-X-TARGETDURATION"] = 2
+    result = {}
+
+    def blocked():
+        result["got"] = get(f"{origin.url}{origin.path}?_HLS_msn=6")
+
+    thread = threading.Thread(target=blocked)
+    thread.start()
+    time.sleep(0.2)
+    assert thread.is_alive()
+    sway.rendered = RENDERED + b"seg6.ts\n"
+    sway.rendered_seq = 6
+    origin.publish()
+    thread.join(5)
+    assert result["got"] == (200, RENDERED + b"seg6.ts\n")
+
+
+def test_files(origin, tmp_path):
+    (tmp_path / "a-seg6.ts").write_bytes(b"\x47" * 188)
+    status, body = get(f"{origin.url}/a-seg6.ts")
+    assert status == 200
+    assert len(body) == 188
+    assert get(f"{origin.url}/missing.ts")[0] == 404
+    assert get(f"{origin.url}/../etc/passwd")[0] == 404
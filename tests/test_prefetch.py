@@ -0,0 +1,118 @@
+"""
+test_prefetch.py
+"""
+
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler
+import pytest
+import fixtures
+from sideways.prefetch import Prefetcher
+from sideways.rapindex import RapIndexCache
+from sideways.segcache import SegmentCache
+
+
+class Quiet(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def origin(serve, tmp_path):
+    """
+    origin serves tmp_path/live over http and
+    returns (folder, base url).
+    """
+    folder = tmp_path / "live"
+    folder.mkdir()
+    return folder, serve(partial(Quiet, directory=str(folder)))
+
+
+def test_prefetched_before_stanza(origin, sway):
+    folder, base = origin
+    fixtures.write_rendition(str(folder), window=2, endlist=False)
+    sidecar = folder / "sidecar.txt"
+    sidecar.write_text(f"25.0,{fixtures.CUE_OUT}\n")
+    sway.args.input = f"{base}/index.m3u8"
+    sway.args.sidecar = str(sidecar)
+    sway.setup()
+    sway.step()
+    assert not sway.prefetch.futures
+    ready = {}
+    chk_cache = sway._chk_cache
+
+    def spy(segment):
+        chk_cache(segment)
+        ready[segment.media] = sway.index.peek(segment.media) is not None
+
+    sway._chk_cache = spy
+    fixtures.write_rendition(str(folder), window=4, endlist=False)
+    # Last-Modified has one second resolution.
+    sway.last_modified = None
+    builds = sway.index.stats()["builds"]
+    sway.step()
+    seg2, seg3 = f"{base}/seg2.ts", f"{base}/seg3.ts"
+    assert list(sway.prefetch.futures) == [seg2, seg3]
+    assert ready == {seg2: True, seg3: True}
+    assert sway.index.stats()["builds"] == builds + 2
+    out = sway.args.output_dir
+    assert os.path.exists(os.path.join(out, "a-seg2.ts"))
+    assert os.path.exists(os.path.join(out, "b-seg2.ts"))
+    sway.close()
+
+
+def test_wait_times_out():
+    release = threading.Event()
+    prefetch = Prefetcher(SegmentCache(), RapIndexCache())
+    prefetch._fetch = lambda uri: release.wait(5)
+    prefetch.submit("http://stalled/seg1.ts")
+    started = time.monotonic()
+    assert not prefetch.wait("http://stalled/seg1.ts", 0.05)
+    assert time.monotonic() - started < 1
+    release.set()
+    assert prefetch.wait("http://stalled/seg1.ts", 1)
+    prefetch.close()
+
+
+def test_wait_unknown_and_failed():
+    prefetch = Prefetcher(SegmentCache(), RapIndexCache())
+    assert not prefetch.wait("http://never/submitted.ts", 0.05)
+    prefetch._fetch = lambda uri: 1 / 0
+    prefetch.submit("http://bad/seg.ts")
+    assert not prefetch.wait("http://bad/seg.ts", 1)
+    prefetch.close()
+
+
+def test_close_stops_threads():
+    prefetch = Prefetcher(SegmentCache(), RapIndexCache())
+    release = threading.Event()
+    prefetch._fetch = lambda uri: release.wait(5)
+    prefetch.submit("http://stalled/seg1.ts")
+    prefetch.submit("http://stalled/seg2.ts")
+    prefetch.close()
+    release.set()
+    assert not prefetch.futures
+    with pytest.raises(RuntimeError):
+        prefetch.submit("http://stalled/seg3.ts")
+
+
+def test_stalled_prefetch_falls_back(origin, sway, monkeypatch):
+    folder, base = origin
+    fixtures.write_rendition(str(folder), window=2)
+    sway.args.input = f"{base}/index.m3u8"
+    sway.setup()
+    release = threading.Event()
+    sway.prefetch._fetch = lambda uri: release.wait(5)
+    media = f"{base}/seg1.ts"
+    sway.prefetch.submit(media)
+    monkeypatch.setattr(sway, "target_duration", lambda: 0.05)
+    monkeypatch.setattr(sway, "_cue_pending", lambda segment: True)
+    segment = type("Segment", (), {"media": media})()
+    started = time.monotonic()
+    sway._chk_cache(segment)
+    assert time.monotonic() - started < 1
+    assert media in sway.cache
+    release.set()
+    sway.close()
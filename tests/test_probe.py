@@ -0,0 +1,144 @@
+"""
+test_probe.py
+"""
+
+import re
+from http.server import BaseHTTPRequestHandler
+import pytest
+import fixtures
+from sideways.probe import PKT_SIZE, PtsProbe
+from sideways.rapindex import RapIndexCache
+from sideways.segcache import SegmentCache
+
+HEAD = PKT_SIZE * 16
+
+
+def segments():
+    """
+    segments returns segment bytes by path,
+    seg1.ts has no PES header in its leading packets.
+    """
+    data, _ = fixtures.ts_segment(10.0, 2.0)
+    late, _ = fixtures.ts_segment(12.0, 2.0)
+    late = fixtures.body_packet() * 32 + late
+    return {"/seg0.ts": data, "/seg1.ts": late, "/short.ts": late[:HEAD]}
+
+
+class Segments(BaseHTTPRequestHandler):
+    """
+    Segments serves segments, honoring Range
+    requests when ranges is set.
+    """
+
+    protocol_version = "HTTP/1.1"
+    media = segments()
+    ranges = True
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = self.media[self.path]
+        rng = self.headers.get("Range")
+        self.requests.append((self.path, rng))
+        match = re.match(r"bytes=(\d+)-(\d+)", rng or "")
+        if self.ranges and match:
+            start, end = int(match[1]), min(int(match[2]), len(data) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            data = data[start : end + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture(params=[True, False], ids=["range", "no-range"])
+def origin(request, serve):
+    """
+    origin serves Segments, with and without Range support,
+    and returns the base url and the requests made.
+    """
+    handler = type("Handler", (Segments,), {"ranges": request.param, "requests": []})
+    return serve(handler), handler.requests
+
+
+def test_head_read(origin, request):
+    base, requests = origin
+    prober = PtsProbe(HEAD)
+    assert prober.probe(f"{base}/seg0.ts") == 10.0
+    saved = len(Segments.media["/seg0.ts"]) - HEAD
+    if "no-range" in request.node.name:
+        saved = 0
+    assert requests == [("/seg0.ts", f"bytes=0-{HEAD - 1}")]
+    assert prober.stats() == {
+        "probes": 1,
+        "fallbacks": 0,
+        "bytes_read": HEAD,
+        "bytes_saved": saved,
+    }
+
+
+def test_full_read_fallback(origin):
+    base, requests = origin
+    prober = PtsProbe(HEAD)
+    assert prober.probe(f"{base}/seg1.ts") == 12.0
+    assert requests == [("/seg1.ts", f"bytes=0-{HEAD - 1}"), ("/seg1.ts", None)]
+    assert prober.fallbacks == 1
+    assert prober.bytes_saved == 0
+    assert prober.bytes_read == HEAD
+
+
+def test_whole_segment_in_head(origin):
+    base, requests = origin
+    prober = PtsProbe(HEAD)
+    assert prober.probe(f"{base}/short.ts") is None
+    assert len(requests) == 1
+    assert prober.fallbacks == 0
+
+
+def test_fallback_through_cache(origin):
+    base, requests = origin
+    cache = SegmentCache()
+    index = RapIndexCache()
+    prober = PtsProbe(HEAD, cache=cache, index=index)
+    uri = f"{base}/seg1.ts"
+    assert prober.probe(uri) == 12.0
+    assert cache.peek(uri) == Segments.media["/seg1.ts"]
+    assert prober.probe(uri) == 12.0
+    assert len(requests) == 2
+    assert prober.stats()["probes"] == 2
+    assert index.stats()["builds"] == 1
+
+
+def test_no_probe_bytes(origin):
+    base, requests = origin
+    prober = PtsProbe(0)
+    assert prober.probe(f"{base}/seg0.ts") == 10.0
+    assert requests == [("/seg0.ts", None)]
+    assert prober.bytes_saved == 0
+
+
+def test_local(tmp_path):
+    for name, data in segments().items():
+        (tmp_path / name.strip("/")).write_bytes(data)
+    prober = PtsProbe(HEAD - 1)
+    assert prober.probe_bytes == HEAD
+    assert prober.probe(str(tmp_path / "seg0.ts")) == 10.0
+    assert prober.probe(str(tmp_path / "seg1.ts")) == 12.0
+    size = len(Segments.media["/seg0.ts"])
+    assert prober.stats() == {
+        "probes": 2,
+        "fallbacks": 1,
+        "bytes_read": HEAD * 2,
+        "bytes_saved": size - HEAD,
+    }
+
+
+def test_http_size():
+    assert PtsProbe._http_size({"Content-Range": "bytes 0-9/100"}) == 100
+    assert PtsProbe._http_size({"Content-Range": "bytes 0-9/*"}) is None
+    assert PtsProbe._http_size({"Content-Length": "50"}) == 50
+    assert PtsProbe._http_size({}) is None
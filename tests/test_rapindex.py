@@ -0,0 +1,126 @@
+"""
+test_rapindex.py
+"""
+
+import pytest
+from iframes import IFramer
+import fixtures
+from sideways.npscan import scan
+from sideways.rapindex import PKT_SIZE, WRAP, RapIndex, RapIndexCache
+
+needs_numpy = pytest.mark.skipif(scan is None, reason="numpy is not installed")
+
+
+def nal_packet(pts):
+    """
+    nal_packet starts a PES with an IDR NAL unit
+    and no adaptation field.
+    """
+    pkt = bytearray(fixtures.pes_packet(int(pts * 90000), idr=False))
+    pkt[18:22] = b"\x00\x00\x01\x65"
+    return bytes(pkt)
+
+
+def iframer_raps(buf):
+    framer = IFramer(shush=True)
+    raps = []
+    for idx in range(0, len(buf) - PKT_SIZE + 1, PKT_SIZE):
+        pts = framer.parse(buf[idx : idx + PKT_SIZE])
+        if pts:
+            raps.append((pts, idx))
+    return raps
+
+
+def raps(rap):
+    return list(zip(rap.pts, rap.offsets))
+
+
+@needs_numpy
+def test_engines_match_1080p():
+    data, idrs = fixtures.ts_segment_1080p(10.0)
+    numpy_rap = RapIndex(data, engine="numpy")
+    python_rap = RapIndex(data, engine="python")
+    assert raps(numpy_rap) == raps(python_rap) == iframer_raps(data) == idrs
+    for pts in (0.0, 10.0, 10.01, 12.0, 13.5, 15.99, 16.0, 99.0):
+        assert numpy_rap.find(pts) == python_rap.find(pts)
+
+
+@needs_numpy
+def test_engines_match_nal():
+    body = fixtures.body_packet()
+    data = b"".join(
+        [
+            fixtures.pes_packet(900000),
+            body,
+            fixtures.pes_packet(903000, idr=False),
+            nal_packet(906000 / 90000),
+            body,
+            b"\x47\x1f\xff\x10" + bytes(184),
+        ]
+    )
+    numpy_rap = RapIndex(data, engine="numpy")
+    assert raps(numpy_rap) == raps(RapIndex(data, engine="python"))
+    assert raps(numpy_rap) == iframer_raps(data)
+    assert numpy_rap.offsets == [0, 3 * PKT_SIZE]
+
+
+def test_empty():
+    rap = RapIndex(b"", engine="python")
+    assert len(rap) == 0
+    assert rap.first() is None
+    assert rap.find(10.0) == (None, 0)
+
+
+def wrapped_segment():
+    """
+    wrapped_segment has random access points
+    one second apart, with the PTS wrapping after the second.
+    """
+    ticks = [(1 << 33) - 180000, (1 << 33) - 90000, 3000, 93000]
+    body = fixtures.body_packet()
+    return b"".join(fixtures.pes_packet(tick) + body for tick in ticks)
+
+
+@pytest.mark.parametrize("engine", ["python", pytest.param("numpy", marks=needs_numpy)])
+def test_wrapped_pts(engine):
+    data = wrapped_segment()
+    rap = RapIndex(data, engine=engine)
+    assert not rap.ordered
+    assert raps(rap) == iframer_raps(data)
+    assert rap.offsets == [0, 376, 752, 1128]
+    before, last = rap.pts[0], rap.pts[-1]
+    assert before == round(WRAP - 2, 6)
+    assert rap.first() == before
+    assert rap.find(before - 0.5) == (before, 0)
+    assert rap.find(before + 0.5) == (rap.pts[1], 376)
+    assert rap.find(WRAP - 0.5) == (rap.pts[2], 752)
+    assert rap.find(0.01) == (rap.pts[2], 752)
+    assert rap.find(0.5) == (last, 1128)
+    assert rap.find(last) == (last, 1128)
+    assert rap.find(2.0) == (None, len(data))
+
+
+def test_cache_lru():
+    cache = RapIndexCache(keep=2)
+    seg = {
+        name: fixtures.ts_segment(start, 2.0)[0]
+        for name, start in (("a", 10.0), ("b", 12.0), ("c", 14.0))
+    }
+    rap_a = cache.get("a", seg["a"])
+    cache.get("b", seg["b"])
+    assert cache.get("a", seg["a"]) is rap_a
+    cache.get("c", seg["c"])
+    assert list(cache.items) == ["a", "c"]
+    assert cache.peek("b") is None
+    assert cache.peek("a") is rap_a
+    assert cache.stats() == {"hits": 2, "builds": 3, "items": 2}
+    assert rap_a.first() == 10.0
+
+
+def test_cache_rebuilds_on_size():
+    cache = RapIndexCache()
+    data = fixtures.ts_segment(10.0, 2.0)[0]
+    rap = cache.get("a", data[: len(data) // 2])
+    assert cache.get("a", data) is not rap
+    assert cache.get("a", data).size == len(data)
+    assert cache.stats()["builds"] == 2
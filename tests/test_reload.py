@@ -0,0 +1,66 @@
+"""
+test_reload.py
+"""
+
+from http.server import BaseHTTPRequestHandler
+
+M3U8 = b"""#EXTM3U
+#EXT-X-VERSION:3
+#EXT-X-TARGETDURATION:2
+#EXT-X-MEDIA-SEQUENCE:0
+#EXTINF:2.0,
+seg0.ts
+#EXTINF:2.0,
+seg1.ts
+"""
+ETAG = '"v1"'
+MODIFIED = "Sat, 17 Oct 2026 12:00:00 GMT"
+
+
+class Conditional(BaseHTTPRequestHandler):
+    """
+    Conditional answers 304 when If-None-Match
+    matches the ETag, and records request headers.
+    """
+
+    protocol_version = "HTTP/1.1"
+    seen = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Last-Modified", MODIFIED)
+        self.send_header("Content-Length", str(len(M3U8)))
+        self.end_headers()
+        self.wfile.write(M3U8)
+
+
+def test_304_reload(serve, sway):
+    handler = type("Handler", (Conditional,), {"seen": []})
+    sway.m3u8 = f"{serve(handler)}/index.m3u8"
+    lines = sway._http_m3u8()
+    assert b"seg1.ts\n" in lines
+    assert sway.etag == ETAG
+    assert sway.last_modified == MODIFIED
+    assert sway.source_changed is not None
+    assert "If-None-Match" not in handler.seen[0]
+    assert sway._http_m3u8() is None
+    assert handler.seen[1]["If-None-Match"] == ETAG
+    assert handler.seen[1]["If-Modified-Since"] == MODIFIED
+
+
+def test_304_reload_has_no_new_segments(serve, sway):
+    handler = type("Handler", (Conditional,), {"seen": []})
+    sway.m3u8 = f"{serve(handler)}/index.m3u8"
+    sway.etag = ETAG
+    assert sway.read_m3u8() == 0
+    assert sway.metrics.counters["playlist_unchanged_total"] == 1
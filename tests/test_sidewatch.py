@@ -0,0 +1,120 @@
+"""
+test_sidewatch.py
+"""
+
+import os
+import pytest
+from sideways import sidewatch
+from sideways.sidewatch import SideWatch
+
+
+@pytest.fixture(params=["inotify", "stat"])
+def watch(request, tmp_path, monkeypatch):
+    """
+    watch is a SideWatch on a temp sidecar,
+    with inotify and with the os.stat fallback.
+    """
+    if request.param == "stat":
+        monkeypatch.setattr(sidewatch, "_inotify", lambda: None)
+    side = SideWatch(str(tmp_path / "sidecar.txt"))
+    if request.param == "inotify" and side.fd is None:
+        side.close()
+        pytest.skip("no inotify")
+    yield side
+    side.close()
+
+
+def write(watch, data, mode="wb"):
+    with open(watch.path, mode) as sidefile:
+        sidefile.write(data)
+    # the stat fallback cannot tell same size writes apart in the same tick
+    stat = os.stat(watch.path)
+    os.utime(watch.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_watch_mode(watch, request):
+    assert (watch.fd is not None) == ("inotify" in request.node.name)
+
+
+def test_missing_sidecar(watch):
+    assert watch.read() == []
+    write(watch, b"1,a\n")
+    assert watch.read() == [b"1,a"]
+
+
+def test_append(watch):
+    write(watch, b"1,a\n")
+    assert watch.read() == [b"1,a"]
+    assert watch.read() == []
+    write(watch, b"2,b\n3,c\n", "ab")
+    assert watch.read() == [b"2,b", b"3,c"]
+    assert watch.read() == []
+    assert watch.offset == 12
+
+
+def test_partial_line(watch):
+    write(watch, b"1,a\n2,")
+    assert watch.read() == [b"1,a"]
+    write(watch, b"b\n3,c", "ab")
+    assert watch.read() == [b"2,b"]
+    assert watch.partial == b"3,c"
+    # the writer is done, the last line is returned as is
+    assert watch.read() == [b"3,c"]
+    assert watch.read() == []
+
+
+def test_truncated(watch):
+    write(watch, b"1,a\n2,b\n")
+    assert watch.read() == [b"1,a", b"2,b"]
+    write(watch, b"3,c\n")
+    assert watch.read() == [b"3,c"]
+    assert watch.offset == 4
+
+
+def test_rewritten_same_size(watch):
+    write(watch, b"1,a\n2,b\n")
+    assert watch.read() == [b"1,a", b"2,b"]
+    write(watch, b"3,c\n4,d\n")
+    assert watch.read() == [b"3,c", b"4,d"]
+
+
+def test_rewritten_longer(watch):
+    write(watch, b"1,a\n")
+    assert watch.read() == [b"1,a"]
+    write(watch, b"2,b\n3,c\n")
+    assert watch.read() == [b"2,b", b"3,c"]
+
+
+def test_rewrite_drops_partial(watch):
+    write(watch, b"1,a\n2,")
+    assert watch.read() == [b"1,a"]
+    write(watch, b"3,c\n")
+    assert watch.read() == [b"3,c"]
+    assert watch.partial == b""
+
+
+def test_replaced_by_rename(watch, tmp_path):
+    write(watch, b"1,a\n")
+    assert watch.read() == [b"1,a"]
+    temp = tmp_path / "sidecar.tmp"
+    temp.write_bytes(b"1,a\n2,b\n")
+    os.replace(temp, watch.path)
+    assert watch.read() == [b"2,b"]
+    temp.write_bytes(b"5,e\n")
+    os.replace(temp, watch.path)
+    assert watch.read() == [b"5,e"]
+
+
+def test_other_files_ignored(watch, tmp_path):
+    write(watch, b"1,a\n")
+    assert watch.read() == [b"1,a"]
+    (tmp_path / "other.txt").write_bytes(b"2,b\n")
+    assert not watch.changed()
+    assert watch.read() == []
+
+
+def test_close(tmp_path):
+    watch = SideWatch(str(tmp_path / "sidecar.txt"))
+    watch.close()
+    watch.close()
+    assert watch.fd is None
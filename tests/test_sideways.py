@@ -0,0 +1,139 @@
+"""
+test_sideways.py
+"""
+
+import pyaes
+import fixtures
+from sideways.aes import mk_iv
+
+KEY = bytes(range(16))
+
+
+def encrypt(plain, iv):
+    """
+    encrypt returns plain AES-128 CBC encrypted with KEY and iv.
+    """
+    encrypter = pyaes.Encrypter(pyaes.AESModeOfOperationCBC(KEY, iv=iv))
+    return encrypter.feed(plain) + encrypter.feed()
+
+
+def write_encrypted(folder, window=4):
+    """
+    write_encrypted writes an AES-128 rendition with a
+    relative key URI to folder, and returns its index.m3u8.
+    """
+    folder.mkdir()
+    (folder / "key.bin").write_bytes(KEY)
+    names = []
+    for seq in range(window):
+        plain, _ = fixtures.ts_segment(10.0 + seq * 6.0, pkts_per_frame=2)
+        names.append(f"seg{seq}.ts")
+        (folder / names[-1]).write_bytes(encrypt(plain, mk_iv(None, seq)))
+    lines = fixtures.media_playlist(names).splitlines(keepends=True)
+    lines.insert(4, '#EXT-X-KEY:METHOD=AES-128,URI="key.bin"\n')
+    index = folder / "index.m3u8"
+    index.write_text("".join(lines))
+    return str(index)
+
+
+def render(sway, index, cues=()):
+    """
+    render runs one step of sway on index,
+    with cues in its sidecar, and returns the m3u8 lines.
+    """
+    sidecar = sway.mk_uri(sway.args.output_dir, "sidecar.txt")
+    with open(sidecar, "w", encoding="utf-8") as side:
+        side.writelines(f"{pts},{cue}\n" for pts, cue in cues)
+    sway.args.input = index
+    sway.args.sidecar = sidecar
+    sway.setup()
+    sway.step()
+    return sway.rendered.decode().splitlines()
+
+
+def test_key_uri_is_absolute(sway, tmp_path):
+    folder = tmp_path / "enc"
+    index = write_encrypted(folder)
+    key = f'URI="{folder}/key.bin"'
+    lines = render(sway, index)
+    assert lines[3] == "#EXT-X-MEDIA-SEQUENCE:1"
+    assert lines[4] == f"#EXT-X-KEY:METHOD=AES-128,{key}"
+    assert lines[7] == f"{folder}/seg1.ts"
+    assert sum(line.startswith("#EXT-X-KEY") for line in lines) == 1
+
+
+def test_key_after_plain_split(sway, tmp_path):
+    folder = tmp_path / "enc"
+    index = write_encrypted(folder)
+    lines = render(sway, index, [(25.0, fixtures.CUE_OUT)])
+    keys = [line for line in lines if line.startswith("#EXT-X-KEY")]
+    assert keys == [
+        "#EXT-X-KEY:METHOD=NONE",
+        "#EXT-X-KEY:METHOD=NONE",
+        f'#EXT-X-KEY:METHOD=AES-128,URI="{folder}/key.bin",'
+        "IV=0x00000000000000000000000000000003",
+    ]
+    assert lines[-1] == f"{folder}/seg3.ts"
+
+
+def test_split_segment_is_seen(sway, tmp_path):
+    index = fixtures.write_rendition(str(tmp_path / "plain"), window=4)
+    lines = render(sway, index, [(25.0, fixtures.CUE_OUT)])
+    assert "a-seg2.ts" in lines
+    assert sway.mk_uri(str(tmp_path / "plain"), "seg2.ts") in sway.seen
+    # reparse the whole body, as when the last uri is gone
+    sway.last_uri = None
+    sway.m3u8_stat = None
+    assert sway.read_m3u8() == 0
+    sway.write_m3u8()
+    assert sway.rendered.decode().splitlines() == lines
+
+
+def test_byterange_split(sway, tmp_path):
+    folder = tmp_path / "plain"
+    index = fixtures.write_rendition(str(folder), window=4)
+    _, idrs = fixtures.ts_segment(22.0)
+    offset = dict(idrs)[25.0]
+    size = (folder / "seg2.ts").stat().st_size
+    sway.args.byterange = True
+    lines = render(sway, index, [(25.0, fixtures.CUE_OUT)])
+    assert lines[1] == "#EXT-X-VERSION:4"
+    ranges = [line for line in lines if line.startswith("#EXT-X-BYTERANGE")]
+    assert ranges == [
+        f"#EXT-X-BYTERANGE:{offset}@0",
+        f"#EXT-X-BYTERANGE:{size - offset}@{offset}",
+    ]
+    media = [line for line in lines if not line.startswith("#")]
+    assert media == [f"{folder}/seg2.ts", f"{folder}/seg2.ts", f"{folder}/seg3.ts"]
+    assert lines.count("#EXTINF:3.0") == 2
+    assert not list(tmp_path.glob("[ab]-*"))
+    assert sway.metrics.counters["split_bytes_total"] == size
+
+
+def test_byterange_version(sway, tmp_path):
+    folder = tmp_path / "plain"
+    index = fixtures.write_rendition(str(folder), window=4)
+    sway.args.byterange = True
+    lines = render(sway, index)
+    assert lines[1] == "#EXT-X-VERSION:4"
+    assert not [line for line in lines if line.startswith("#EXT-X-BYTERANGE")]
+
+
+def test_byterange_newer_version(sway, tmp_path):
+    index = fixtures.write_rendition(str(tmp_path / "v6"), window=4)
+    with open(index, encoding="utf-8") as m3u8:
+        text = m3u8.read().replace("VERSION:3", "VERSION:6")
+    with open(index, "w", encoding="utf-8") as m3u8:
+        m3u8.write(text)
+    sway.args.byterange = True
+    assert render(sway, index)[1] == "#EXT-X-VERSION:6"
+
+
+def test_byterange_aes_split_is_written(sway, tmp_path):
+    index = write_encrypted(tmp_path / "enc")
+    sway.args.byterange = True
+    lines = render(sway, index, [(25.0, fixtures.CUE_OUT)])
+    assert not [line for line in lines if line.startswith("#EXT-X-BYTERANGE")]
+    assert "a-seg2.ts" in lines
+    assert "b-seg2.ts" in lines
+    assert (tmp_path / "a-seg2.ts").exists()
@@ -0,0 +1,155 @@
+"""
+test_splitstream.py
+"""
+
+import os
+from functools import partial
+from http.server import SimpleHTTPRequestHandler
+import pytest
+import fixtures
+from sideways.rapindex import RapIndexCache
+from sideways.segcache import SegmentCache
+from sideways.splitstream import SplitStream
+
+
+class Quiet(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def segment(tmp_path):
+    """
+    segment writes a six second segment starting at 10.0
+    and returns (path, bytes, idrs).
+    """
+    data, idrs = fixtures.ts_segment(10.0, 6.0)
+    path = tmp_path / "seg0.ts"
+    path.write_bytes(data)
+    return str(path), data, idrs
+
+
+@pytest.fixture
+def out(tmp_path):
+    folder = tmp_path / "out"
+    folder.mkdir()
+    return str(folder)
+
+
+def halves(a_media, b_media):
+    with open(a_media, "rb") as a, open(b_media, "rb") as b:
+        return a.read(), b.read()
+
+
+def broken(*args):
+    raise OSError("not supported")
+
+
+def short(real):
+    """
+    short copies at most 1000 bytes, once,
+    like a kernel copy that stops early.
+    """
+    done = []
+
+    def _short(out_fd, in_fd, offset, count):
+        if done:
+            return 0
+        done.append(count)
+        return real(out_fd, in_fd, offset, min(count, 1000))
+
+    return _short
+
+
+@pytest.fixture(params=["copy_file_range", "sendfile", "short", "slice"])
+def copy(request, monkeypatch):
+    """
+    copy makes _copy_range use copy_file_range, sendfile,
+    a kernel copy that stops early, or the slice of buf.
+    """
+    calls = []
+
+    def spy(func):
+        def _spy(*args):
+            calls.append(func)
+            return func(*args)
+
+        return _spy
+
+    if request.param == "copy_file_range" and not hasattr(os, "copy_file_range"):
+        pytest.skip("no copy_file_range")
+    if request.param != "copy_file_range":
+        monkeypatch.delattr(os, "copy_file_range", raising=False)
+    if request.param == "copy_file_range":
+        monkeypatch.setattr(os, "copy_file_range", spy(os.copy_file_range))
+    elif request.param == "sendfile":
+        monkeypatch.setattr(os, "sendfile", spy(os.sendfile))
+    elif request.param == "short":
+        monkeypatch.setattr(os, "sendfile", spy(short(os.sendfile)))
+    else:
+        monkeypatch.setattr(os, "sendfile", spy(broken))
+    return calls
+
+
+@pytest.mark.parametrize("pts", [12.0, 12.01, 10.0, 15.0, 99.0])
+def test_split_local(segment, out, copy, pts):
+    path, data, idrs = segment
+    splice_point, a_media, b_media = SplitStream().split_at(path, pts, out)
+    a, b = halves(a_media, b_media)
+    assert a + b == data
+    assert copy
+    expected = [idr for idr in idrs if idr[0] >= pts]
+    if expected:
+        assert (splice_point, len(a)) == expected[0]
+    else:
+        assert splice_point is None
+        assert b == b""
+    assert a_media == os.path.join(out, "a-seg0.ts")
+    assert b_media == os.path.join(out, "b-seg0.ts")
+
+
+def test_split_local_indexed(segment, out):
+    path, data, idrs = segment
+    index = RapIndexCache()
+    stream = SplitStream(index=index)
+    splice_point, a_media, b_media = stream.split_at(path, 13.0, out)
+    assert b"".join(halves(a_media, b_media)) == data
+    assert splice_point == 13.0
+    assert stream.splice_range(path, 13.0) == (13.0, idrs[3][1], len(data))
+    assert index.stats()["builds"] == 1
+
+
+def test_split_data(segment, out):
+    path, data, idrs = segment
+    splice_point, a_media, b_media = SplitStream().split_data(
+        "http://example.com/seg0.ts?token=1", data, 14.0, out
+    )
+    a, b = halves(a_media, b_media)
+    assert a + b == data
+    assert (splice_point, len(a)) == idrs[4]
+    assert a_media.endswith("a-seg0.ts")
+
+
+def test_split_http(segment, out, serve):
+    path, data, idrs = segment
+    base = serve(partial(Quiet, directory=os.path.dirname(path)))
+    uri = f"{base}/seg0.ts"
+    stream = SplitStream()
+    splice_point, a_media, b_media = stream.split_at(uri, 12.0, out)
+    a, b = halves(a_media, b_media)
+    assert a + b == data
+    assert (splice_point, len(a)) == idrs[2]
+    assert stream.splice_range(uri, 12.0) == (12.0, idrs[2][1], len(data))
+
+
+def test_split_http_cached(segment, out, serve):
+    path, data, idrs = segment
+    base = serve(partial(Quiet, directory=os.path.dirname(path)))
+    uri = f"{base}/seg0.ts"
+    cache = SegmentCache()
+    stream = SplitStream(cache=cache)
+    splice_point, a_media, b_media = stream.split_at(uri, 12.0, out)
+    assert b"".join(halves(a_media, b_media)) == data
+    assert splice_point == 12.0
+    assert stream.splice_range(uri, 12.0) == (12.0, idrs[2][1], len(data))
+    assert cache.stats()["misses"] == 1
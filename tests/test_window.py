@@ -0,0 +1,93 @@
+"""
+test_window.py
+"""
+
+from sideways.window import SeenMedia, SegmentWindow
+
+
+class Segment:
+    """
+    Segment has what a SegmentRecord keeps of a segment.
+    """
+
+    def __init__(self, seq, key_line=None, tags=""):
+        self.seq = seq
+        self.media = f"seg{seq}.ts"
+        self.start = seq * 2.0
+        self.duration = 2.0
+        self.key_line = key_line
+        self.tags = tags
+
+    def as_bytes(self):
+        return f"{self.tags}#EXTINF:2.0,\n{self.media}\n".encode()
+
+
+def seqs(window):
+    return [record.seq for record in window]
+
+
+def test_window_evicts_oldest():
+    window = SegmentWindow(3)
+    for seq in range(5):
+        record = window.append(Segment(seq))
+    assert record.seq == 4
+    assert len(window) == 3
+    assert seqs(window) == [2, 3, 4]
+    assert window[0].media == "seg2.ts"
+    assert window.evicted == 2
+
+
+def test_window_resize():
+    window = SegmentWindow(5)
+    for seq in range(5):
+        window.append(Segment(seq))
+    window.resize(2)
+    assert seqs(window) == [3, 4]
+    assert window.evicted == 3
+    window.resize(4)
+    window.append(Segment(5))
+    window.append(Segment(6))
+    assert seqs(window) == [3, 4, 5, 6]
+    assert window.evicted == 3
+    window.resize(0)
+    assert seqs(window) == [6]
+
+
+def test_window_key_bytes():
+    key = b"#EXT-X-KEY:METHOD=AES-128\n"
+    window = SegmentWindow(3)
+    window.append(Segment(0))
+    window.append(Segment(1, key_line=key))
+    window.append(Segment(2, key_line=key, tags=key.decode()))
+    assert [record.key_bytes() for record in window] == [b"", key, b""]
+    assert window.nbytes() > 0
+
+
+def test_seen_is_bounded():
+    seen = SeenMedia(3)
+    for seq in range(5):
+        seen.add(f"seg{seq}.ts")
+    assert len(seen) == 3
+    assert "seg1.ts" not in seen
+    assert list(seen.order) == ["seg2.ts", "seg3.ts", "seg4.ts"]
+
+
+def test_seen_ignores_repeats():
+    seen = SeenMedia(3)
+    for media in ("seg0.ts", "seg1.ts", "seg0.ts", "seg2.ts"):
+        seen.add(media)
+    assert list(seen.order) == ["seg0.ts", "seg1.ts", "seg2.ts"]
+    seen.add("seg3.ts")
+    assert "seg0.ts" not in seen
+    assert len(seen.order) == len(seen) == 3
+
+
+def test_seen_resize():
+    seen = SeenMedia(4)
+    for seq in range(4):
+        seen.add(f"seg{seq}.ts")
+    seen.resize(2)
+    assert list(seen.order) == ["seg2.ts", "seg3.ts"]
+    assert seen.members == {"seg2.ts", "seg3.ts"}
+    seen.resize(0)
+    assert len(seen) == 1